@@ -6,42 +6,58 @@ Project Owner: Monica Piccinini (monicapiccinini12@gmail.com)
 
 The module contains the following functions:
     - extractJobs: Fetches job listings from various platforms based on the provided URLs and keywords.
+    - streamJobs: Yields job listings from all platforms as soon as each one is rated.
+    - storedJobs: Answers a search from the job store when it holds enough jobs scraped recently.
+    - cut_short: Lists the sites whose scraping was cut by their deadline.
     - create_time_param: Converts a time period string into a LinkedIn time parameter.
 
 The module also defines the following FastAPI endpoints:
-    - /jobs: Accepts a POST request with job titles, keywords, time period, and location, and returns the relevant job listings.
+    - /jobs: Accepts a POST request with job titles, keywords, time period, and location, and returns the relevant job listings,
+      best first, only the best top_k of them when top_k is given (see module.ranking).
+    - /jobs/stream: Accepts the same POST request as /jobs and streams each job as newline delimited JSON as soon as it is rated.
     - /: Displays a "Hello World" message.
+
+Every search runs within a time budget (JOBS_REQUEST_BUDGET, see module.deadline). When it is spent, the endpoints
+return the jobs that are ready and list the sites that were cut short.
+
+The jobs scraped are kept in the job store (see module.store). A search is answered from it, without crawling the
+sites, when it holds enough jobs of the same titles and location scraped recently.
 """
 
 
 # Import FastAPI and requests libraries
 from fastapi import FastAPI, Query, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 from pydantic import BaseModel
 from bs4 import BeautifulSoup
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Literal
 
 from woocommerce import API
 
-from module.docsim import rate_text, normalize_text
+from module.docsim import rate_text, rate_texts, normalize_text, KeywordMatcher
+from module import client
+from module.cache import create_cache, make_key, description_cache
+from module.locations import get_location, seed_locations, warm_locations, WARM_LOCATIONS
+from module.deadline import Deadline, DeadlineExceeded, REQUEST_BUDGET, SITE_BUDGET
+from module.ranking import TopK, rank_jobs
+from module.dedupe import Deduper
+from module.prefilter import CardFilter, max_age
+from module.store import job_store
 
 from module.jobs99 import Jobs99
 from module.linkedin import LinkedIn
 from module.trabalha import Trabalha
-from module.infojobs import Infojobs, get_location
+from module.infojobs import Infojobs
 from module.gupy import Gupy
 from module.balcaodeem import Balca
 
 from itertools import repeat
 from math import sqrt
 
-from concurrent.futures import ThreadPoolExecutor
-from threading import Event, Thread
-
 import os
-import requests
+import asyncio
 import json
 import re
 import time
@@ -61,6 +77,19 @@ class JobsParams(BaseModel):
     time_period: str
     location: str
     cards_offset: Optional[int] = 10
+    # 'ratio' (keyword hits per word), 'bm25' or 'tfidf', see module.docsim.score_counts
+    rating_mode: Literal['ratio', 'bm25', 'tfidf'] = 'ratio'
+    # return only the best top_k jobs, ranked by rating or by recency (newest first)
+    top_k: Optional[int] = None
+    rank_by: Literal['rating', 'recency'] = 'rating'
+    # return a posting found on several sites once, see module.dedupe
+    dedupe: Optional[bool] = True
+    # rules checked on the job cards before their description is fetched, see module.prefilter
+    exclude_companies: List[str] = []
+    title_must: List[str] = []
+    title_must_not: List[str] = []
+    # jobURL of the jobs the client already has
+    seen_ids: List[str] = []
 
 '''
 wcapi = API(
@@ -101,25 +130,31 @@ url2 = 'https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search?k
 
 LOCATION = 'Brazil'
 
+# Searches with the same normalized parameters are answered from this cache.
+# Set JOBS_CACHE_PATH to share it between the gunicorn workers.
+RESULT_CACHE_TTL = int(os.environ.get('JOBS_RESULT_CACHE_TTL', 600))
+RESULT_CACHE_SIZE = int(os.environ.get('JOBS_RESULT_CACHE_SIZE', 256))
 
-def execute_constructor(constructor):
-    jobs = constructor.main()
-    return jobs
+result_cache = create_cache('search_results', RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
 
 
-def extractJobs(urls:list, plavras:list, timeout_event: Event, time_period, card_num=10):
+def create_constructors(urls:list, plavras:list, deadline: Deadline, time_period, card_num=10, ranking=None, dedupe=None, prefilter=None):
   """
-    Extracts job information from a list of LinkedIn job search URLs and a list of keywords (plavras).
+    Groups the job search URLs by site and creates one scraper for each site.
+    Every scraper gets its own deadline, at most SITE_BUDGET seconds and never later than the request deadline.
     
     Args:
-        urls (List[str]): A list of LinkedIn job search URLs.
-        plavras (List[str]): A list of keywords to rate the jobs.
-        timeout_event: an instance of threading Event to handle timeout
+        urls (List[str]): A list of job search URLs.
+        plavras (Union[List[str], KeywordMatcher]): The keywords to rate the jobs, compiled once for the search.
+        deadline: Deadline of the request
         time_period: str: time period based on LinkedIn time_period params
         card_num: int: number of cards per job keyword
+        ranking (Optional[TopK]): The best jobs of the search so far, shared by the scrapers to skip the cards that cannot enter them
+        dedupe (Optional[Deduper]): The postings found by the search so far, shared by the scrapers to drop the duplicates
+        prefilter (Optional[CardFilter]): The rules checked on the cards before their description is fetched
     
     Returns:
-        Tuple[List[dict], int]: A tuple containing a list of job dictionaries and the total number of cards.
+        List: A list of scraper objects.
   """
   # separate job URLS
   sites = {}
@@ -151,38 +186,219 @@ def extractJobs(urls:list, plavras:list, timeout_event: Event, time_period, card
     
       
       
-  jobs = []
-  
   constructors = []
   
   for key, value in sites.items():
+    site_deadline = deadline.child(SITE_BUDGET)
     if key == 'infojobs':
-      constructors.append(Infojobs(value, plavras, timeout_event, time_period, card_num))
-    '''elif key == 'balca':
-      constructors.append(Balca(value, plavras, timeout_event, time_period, card_num))
+      constructors.append(Infojobs(value, plavras, site_deadline, time_period, card_num))
+    elif key == 'balca':
+      constructors.append(Balca(value, plavras, site_deadline, time_period, card_num))
     elif key == '99jobs':
-      constructors.append(Jobs99(value, plavras, timeout_event, time_period, card_num))
+      constructors.append(Jobs99(value, plavras, site_deadline, time_period, card_num))
     elif key == 'linkedin':
-      constructors.append(LinkedIn(value, plavras, timeout_event, card_num))
+      constructors.append(LinkedIn(value, plavras, site_deadline, card_num))
     elif key == 'trabalha':
-      constructors.append(Trabalha(value, plavras, timeout_event, card_num))
+      constructors.append(Trabalha(value, plavras, site_deadline, card_num))
     elif key == 'gupy':
-      constructors.append(Gupy(value, plavras, timeout_event, time_period, card_num))'''
+      constructors.append(Gupy(value, plavras, site_deadline, time_period, card_num))
+  
+  for constructor in constructors:
+    constructor.ranking = ranking
+    constructor.dedupe = dedupe
+    constructor.prefilter = prefilter
       
-  total_jobs = 0
-  job_data_list = []
-  with ThreadPoolExecutor(max_workers=10) as executor:
-    job_data = executor.map(execute_constructor, constructors)
+  return constructors
+
+
+async def extractJobs(urls:list, plavras:list, deadline: Deadline, time_period, card_num=10, rating_mode='ratio', top_k=None, rank_by='rating', dedupe=True, prefilter=None, search=None):
+  """
+    Extracts job information from a list of LinkedIn job search URLs and a list of keywords (plavras).
     
-    job_data_list= list(job_data)
+    Args:
+        urls (List[str]): A list of LinkedIn job search URLs.
+        plavras (List[str]): A list of keywords to rate the jobs.
+        deadline: Deadline of the request, the jobs ready when it passes are returned
+        time_period: str: time period based on LinkedIn time_period params
+        card_num: int: number of cards per job keyword
+        rating_mode: str: rating mode of the jobs, 'ratio', 'bm25' or 'tfidf'
+        top_k: Optional[int]: number of jobs returned, all of them when None
+        rank_by: str: order of the jobs, 'rating' or 'recency'
+        dedupe: bool: return a posting found several times once
+        prefilter (Optional[CardFilter]): The rules checked on the cards, only the time period when None
+        search (Optional[Tuple[List[str], str]]): The titles and location of the search, the jobs found are linked to them in the job store
+    
+    Returns:
+        Tuple[List[dict], int, dict]: A tuple containing a list of job dictionaries, best first, the total number of cards
+        and {'cutShort': [...]}, the names of the sites cut short by their deadline.
+  """
+  jobs = []
+  
+  # the keywords are compiled once and shared by every scraper of the search, each job is rated as soon as its
+  # description arrives, while the other requests of the search are waiting on the network
+  matcher = KeywordMatcher(plavras, rating_mode) if plavras else plavras
+  # only the recency ranking can skip cards before their description, the jobs are ranked once all are found
+  ranking = TopK(top_k, rank_by) if top_k and rank_by == 'recency' else None
+  deduper = Deduper() if dedupe else None
+  prefilter = prefilter or CardFilter(max_age(time_period))
+  constructors = create_constructors(urls, matcher, deadline, time_period, card_num, ranking, deduper, prefilter)
+      
+  total_jobs = 0
+  job_data_list = await asyncio.gather(*[constructor.main() for constructor in constructors])
     
   for jb in job_data_list:
     total_jobs+= jb[1]
     jobs.extend(jb[0])
+  
+  if deduper:
+    print('Duplicate postings dropped: ', deduper.duplicates)
+  print('Cards dropped before their description: ', prefilter.skipped)
+
+  # every job found is linked to the search, not only the best top_k
+  if search and job_store is not None:
+    await asyncio.to_thread(job_store.link, *search, [job['jobURL'] for job in jobs])
+  
+  # jobs ranked the same stay mixed across the sites
+  random.shuffle(jobs)
+  jobs = rank_jobs(jobs, rank_by, top_k)
+    
+  return [jobs, total_jobs, {'cutShort': cut_short(constructors)}]
+
+
+async def storedJobs(titles:list, plavras:list, time_period, location, card_num=10, rating_mode='ratio', top_k=None, rank_by='rating', dedupe=True, prefilter=None):
+  """
+    Answers a search from the job store (see module.store) when it holds at least card_num jobs per title
+    scraped less than JOBS_STORE_TTL seconds ago, so that the sites are not crawled again. Otherwise the crawl
+    still reads the descriptions of these jobs from the store, see Scraper.stored_description.
+    
+    Args:
+        titles (List[str]): The job titles of the search.
+        plavras (List[str]): A list of keywords to rate the jobs.
+        time_period: str: time period based on LinkedIn time_period params
+        location (str): The location of the search.
+        card_num: int: number of cards per job keyword
+        rating_mode: str: rating mode of the jobs, 'ratio', 'bm25' or 'tfidf'
+        top_k: Optional[int]: number of jobs returned, all of them when None
+        rank_by: str: order of the jobs, 'rating' or 'recency'
+        dedupe: bool: return a posting found several times once
+        prefilter (Optional[CardFilter]): The rules checked on the jobs, only the time period when None
     
+    Returns:
+        Optional[List[dict]]: The job dictionaries, best first, or None when the sites have to be crawled.
+  """
+  if job_store is None:
+    return None
+  
+  wanted = card_num * len(titles)
+  # a crawl returns at most card_num jobs per title from each of the 6 sites
+  rows = await asyncio.to_thread(job_store.search, titles, location, max_age(time_period), wanted * 6)
+  
+  prefilter = prefilter or CardFilter(max_age(time_period))
+  deduper = Deduper() if dedupe else None
+  found = []
+  for job, description in rows:
+    if not prefilter.admits(title=job['jobTitle'], company=job['companyName'], job_id=job['jobURL']):
+      continue
+    if deduper and (not deduper.claim(job['jobTitle'], job['companyName'], job['location']) or deduper.is_duplicate(description, job['jobTitle'], job['companyName'], job['location'])):
+      continue
+    found.append((job, description))
+  
+  if len(found) < wanted:
+    return None
+  
+  if plavras:
+    matcher = KeywordMatcher(plavras, rating_mode)
+    ratings = await asyncio.to_thread(rate_texts, [normalize_text(description) for _, description in found], matcher)
+  else:
+    ratings = [0] * len(found)
+  
+  jobs = []
+  for (job, _), rating in zip(found, ratings):
+    jobs.append({
+      "jobTitle": job['jobTitle'],
+      "companyName": job['companyName'],
+      "dayPosted": job['dayPosted'],
+      "datePosted": job['datePosted'],
+      "jobURL": job['jobURL'],
+      'rating': rating,
+      'location': job['location']
+      })
+  
+  # jobs ranked the same stay mixed across the sites
   random.shuffle(jobs)
+  return rank_jobs(jobs, rank_by, top_k)
+
+
+def cut_short(constructors:list):
+  """
+    Returns the names of the sites whose scraping was cut by their deadline.
+  """
+  return [constructor.site for constructor in constructors if constructor.deadline.exceeded]
+
+
+async def streamJobs(urls:list, plavras:list, deadline: Deadline, time_period, card_num=10, rating_mode='ratio', top_k=None, rank_by='rating', dedupe=True, prefilter=None, search=None):
+  """
+    Yields job information from all sites as soon as each job is rated, instead of waiting for every site to finish.
     
-  return [jobs, total_jobs]
+    Args:
+        urls (List[str]): A list of job search URLs.
+        plavras (List[str]): A list of keywords to rate the jobs.
+        deadline: Deadline of the request, the stream ends when it passes
+        time_period: str: time period based on LinkedIn time_period params
+        card_num: int: number of cards per job keyword
+        rating_mode: str: rating mode of the jobs, 'ratio', 'bm25' or 'tfidf'
+        top_k: Optional[int]: only the jobs among the best top_k so far are yielded, all of them when None
+        rank_by: str: order of the best jobs, 'rating' or 'recency'
+        dedupe: bool: yield a posting found several times once
+        prefilter (Optional[CardFilter]): The rules checked on the cards, only the time period when None
+        search (Optional[Tuple[List[str], str]]): The titles and location of the search, the jobs found are linked to them in the job store
+    
+    Yields:
+        dict: A job dictionary. The last item is {'cutShort': [...]}, the names of the sites cut short by their deadline.
+        With top_k, it also has 'topK', the URLs of the best top_k jobs, best first: a job yielded early may have been
+        pushed out by better ones.
+  """
+  # the keywords are compiled once and shared by every scraper of the search
+  matcher = KeywordMatcher(plavras, rating_mode) if plavras else plavras
+  ranking = TopK(top_k, rank_by) if top_k else None
+  deduper = Deduper() if dedupe else None
+  prefilter = prefilter or CardFilter(max_age(time_period))
+  constructors = create_constructors(urls, matcher, deadline, time_period, card_num, ranking, deduper, prefilter)
+  queue = asyncio.Queue()
+  
+  async def drain(constructor):
+    # forward the jobs of one site to the queue, None marks the end of the site
+    try:
+      async for job in constructor.stream():
+        await queue.put(job)
+    except Exception as e:
+      logging.error('Error while streaming %s jobs: %s', type(constructor).__name__, str(e))
+    finally:
+      await queue.put(None)
+  
+  tasks = [asyncio.create_task(drain(constructor)) for constructor in constructors]
+  found = []
+  try:
+    running = len(tasks)
+    while running:
+      job = await queue.get()
+      if job is None:
+        running -= 1
+        continue
+      found.append(job['jobURL'])
+      # with top_k, the jobs pushed out of the best ones while queued are dropped
+      if ranking is None or job in ranking:
+        yield job
+    # every job found is linked to the search, not only the best top_k
+    if search and job_store is not None:
+      await asyncio.to_thread(job_store.link, *search, found)
+    if ranking is None:
+      yield {'cutShort': cut_short(constructors)}
+    else:
+      yield {'cutShort': cut_short(constructors), 'topK': [job['jobURL'] for job in ranking.jobs()]}
+  finally:
+    for task in tasks:
+      task.cancel()
   
    
 #@app.post("/search_customer/")
@@ -254,33 +470,18 @@ def create_time_param(time):
   return TPeriod
 
 
-# Define a GET endpoint that takes a query parameter 'url' and returns the result of extractJobs function
-@app.post("/jobs")
-def get_jobs(user_params: JobsParams):
+async def create_urls(titles, time_period, location):
     """
-    FastAPI endpoint that accepts a JobsParams object containing user search parameters.
-    Returns the result of the extractJobs function as a JSON response.
+    Builds the job search URLs of every site for the given titles.
     
     Args:
-        user_params (JobsParams): A Pydantic model containing user search parameters.
+        titles (List[str]): The job titles to search for.
+        time_period (str): LinkedIn time parameter returned by create_time_param.
+        location (str): Location in the "city, state, country" format.
     
     Returns:
-        fastapi.responses.JSONResponse: A JSON response containing a list of job dictionaries and the total number of cards.
+        List[str]: A list of job search URLs.
     """
-    start_time = time.time()
-
-    titles = user_params.titles
-    plavra = user_params.plavra
-    time_period = user_params.time_period
-    location = user_params.location
-    
-    try:
-        cards_offset = user_params.cards_offset
-    except:
-        cards_offset = 10
-
-    time_period = create_time_param(time_period)
-
     # Split location into city, state, and country
     location_parts = location.split(', ')
     city = state = None
@@ -292,6 +493,15 @@ def get_jobs(user_params: JobsParams):
 
     location = location.replace(" ", "%20").replace(",", "%2C")
 
+    # the infojobs location ids are looked up once for all titles
+    _infojobs_location_id = []
+    if city:
+        try:
+            _infojobs_location_id = await get_location(city)
+        except Exception as e:
+            # search the whole country rather than failing the request
+            logging.error('Error while getting the infojobs location of %s: %s', city, str(e))
+
     urls = []
 
     for title in titles:
@@ -310,13 +520,9 @@ def get_jobs(user_params: JobsParams):
         
         # infojobs URL
         _infojobs_link = f'https://www.infojobs.com.br/empregos.aspx?palabra={keywords}'
-        if city:
-            _infojobs_location_id = get_location(city)
-            for loc in _infojobs_location_id:
-                _infojobs_link = f'https://www.infojobs.com.br/empregos.aspx?palabra={keywords}'
-                _infojobs_link+= f'&poblacion={loc}'
-                urls.append(_infojobs_link)
-        else:
+        for loc in _infojobs_location_id:
+            urls.append(_infojobs_link + f'&poblacion={loc}')
+        if not _infojobs_location_id:
             urls.append(_infojobs_link)
             
         # trabalha
@@ -324,7 +530,8 @@ def get_jobs(user_params: JobsParams):
         urls.append(_trabalha_link)
         
         # gupy
-        _gupy_url = f'https://portal.api.gupy.io/api/v1/jobs?jobName={keywords}&limit=50&offset=1'
+        # limit and offset are set by the Gupy scraper from cards_offset
+        _gupy_url = f'https://portal.api.gupy.io/api/v1/jobs?jobName={keywords}'
         urls.append(_gupy_url)
         
         # balca
@@ -333,36 +540,214 @@ def get_jobs(user_params: JobsParams):
         if city:
             _balca_url += urllib.parse.quote(city)
         urls.append(_balca_url)
-        
-    timeout_event = Event()
-    extraction_completed = Event()
+
+    return urls
+
+
+def read_keywords(plavra):
+    """
+    Reads the keywords of a search, the only form of plavra used after the request is parsed.
+    
+    Args:
+        plavra (Union[List[str], bool]): The plavra parameter of the request.
+    
+    Returns:
+        Union[List[str], bool]: The keywords that are strings, or False when there are none to rate the jobs with.
+    """
+    if not isinstance(plavra, list):
+        return False
+    return [word for word in plavra if isinstance(word, str)] or False
+
+
+def read_params(user_params: JobsParams):
+    """
+    Reads the search parameters shared by the /jobs endpoints.
+    
+    Args:
+        user_params (JobsParams): A Pydantic model containing user search parameters.
+    
+    Returns:
+        Tuple: titles, plavra, LinkedIn time parameter, location, cards_offset and rating_mode.
+    """
+    titles = user_params.titles
+    plavra = read_keywords(user_params.plavra)
+    time_period = user_params.time_period
+    location = user_params.location
+    
+    try:
+        cards_offset = user_params.cards_offset
+    except:
+        cards_offset = 10
+
+    time_period = create_time_param(time_period)
+    
+    return titles, plavra, time_period, location, cards_offset, user_params.rating_mode
+
+
+def create_prefilter(user_params: JobsParams, time_period):
+    """
+    Creates the rules checked on the job cards of a search before their description is fetched.
+    
+    Args:
+        user_params (JobsParams): A Pydantic model containing user search parameters.
+        time_period (str): The LinkedIn time parameter of the search.
     
-    def stop_extraction():
-        extraction_completed.wait(75)  # Wait for up to 90 seconds for extraction to complete
-        timeout_event.set()
+    Returns:
+        CardFilter: The rules of the search.
+    """
+    return CardFilter(max_age(time_period), user_params.exclude_companies, user_params.title_must,
+                      user_params.title_must_not, user_params.seen_ids)
 
-    def perform_extraction():
-        global result
-        result = extractJobs(urls, plavra, timeout_event, time_period, cards_offset)
-        extraction_completed.set()  # Signal that extraction is complete
 
+def create_cache_key(user_params: JobsParams):
+    """
+    Builds the result cache key of a search from a canonical form of its parameters, so that searches
+    that only differ in case, spacing or in the order of titles and keywords share the same entry.
+    
+    Args:
+        user_params (JobsParams): A Pydantic model containing user search parameters.
+    
+    Returns:
+        str: The cache key.
+    """
+    def canonical(value):
+        return ' '.join(normalize_text(value).lower().split())
+
+    titles = sorted({canonical(title) for title in user_params.titles})
+    plavra = read_keywords(user_params.plavra)
+    plavra = sorted({canonical(word) for word in plavra}) if plavra else False
 
-    extraction_thread = Thread(target=perform_extraction)
-    extraction_thread.start()
+    prefilter = [sorted({canonical(value) for value in values}) for values in
+                 (user_params.exclude_companies, user_params.title_must, user_params.title_must_not)]
 
-    timeout_thread = Thread(target=stop_extraction)
-    timeout_thread.start()
+    return make_key(titles, plavra, canonical(user_params.time_period), canonical(user_params.location), user_params.cards_offset, user_params.rating_mode, user_params.top_k, user_params.rank_by, user_params.dedupe, prefilter, sorted(set(user_params.seen_ids)))
 
-    extraction_thread.join()  # Wait for extraction_thread to finish
-    timeout_thread.join()  # Wait for timeout_thread to finish
+
+# Define a GET endpoint that takes a query parameter 'url' and returns the result of extractJobs function
+@app.post("/jobs")
+async def get_jobs(user_params: JobsParams):
+    """
+    FastAPI endpoint that accepts a JobsParams object containing user search parameters.
+    Returns the result of the extractJobs function as a JSON response.
+    
+    Args:
+        user_params (JobsParams): A Pydantic model containing user search parameters.
+    
+    Returns:
+        fastapi.responses.JSONResponse: A JSON response containing a list of job dictionaries, ranked by rank_by and
+        cut to the best top_k when it is given, the total number of cards and {"cutShort": [...]}, the sites that ran out of time. Once the time budget of the request is spent,
+        the jobs that are ready are returned.
+    """
+    start_time = time.time()
+
+    cache_key = create_cache_key(user_params)
+    result = await result_cache.aget(cache_key)
+    if result is not None:
+        print(f"Served from the result cache in {time.time() - start_time:.2f} seconds")
+        return JSONResponse(content=result + [{'cutShort': []}])
+
+    titles, plavra, time_period, location, cards_offset, rating_mode = read_params(user_params)
+
+    stored = await storedJobs(titles, plavra, time_period, location, cards_offset, rating_mode, user_params.top_k, user_params.rank_by, user_params.dedupe, create_prefilter(user_params, time_period))
+    if stored is not None:
+        print(f"Served from the job store in {time.time() - start_time:.2f} seconds")
+        return JSONResponse(content=[stored, len(stored), {'cutShort': []}])
+
+    deadline = Deadline(REQUEST_BUDGET)
+    try:
+        urls = await deadline.run(create_urls, titles, time_period, location)
+    except DeadlineExceeded:
+        urls = []
+
+    result = await extractJobs(urls, plavra, deadline, time_period, cards_offset, rating_mode, user_params.top_k, user_params.rank_by, user_params.dedupe, create_prefilter(user_params, time_period), (titles, location))
+
+    # partial results of a search cut short are not cached
+    if not result[2]['cutShort']:
+        await result_cache.aset(cache_key, result[:2])
 
     elapsed_time = time.time() - start_time
     
     print('REQUESTED URIs: ', urls)
     print(f"Time taken to extract job description: {elapsed_time:.2f} seconds")
+    print('Description cache: ', description_cache.stats())
     return JSONResponse(content=result)
 
 
+@app.post("/jobs/stream")
+async def stream_jobs(user_params: JobsParams):
+    """
+    FastAPI endpoint that accepts the same parameters as /jobs but streams the jobs as newline delimited JSON
+    (one job per line) as soon as each one is rated, so clients can render the first results right away
+    and stop reading once they have enough.
+    
+    Args:
+        user_params (JobsParams): A Pydantic model containing user search parameters.
+    
+    Returns:
+        fastapi.responses.StreamingResponse: An application/x-ndjson response with one job dictionary per line.
+        The last line is {"cutShort": [...]}, the sites that ran out of time. With top_k, only the jobs among
+        the best so far are streamed and the last line also has "topK", the URLs of the best jobs, best first.
+    """
+    titles, plavra, time_period, location, cards_offset, rating_mode = read_params(user_params)
+
+    cache_key = create_cache_key(user_params)
+    result = await result_cache.aget(cache_key)
+    if result is None:
+        stored = await storedJobs(titles, plavra, time_period, location, cards_offset, rating_mode, user_params.top_k, user_params.rank_by, user_params.dedupe, create_prefilter(user_params, time_period))
+        if stored is not None:
+            result = [stored, len(stored)]
+
+    if result is not None:
+        if user_params.top_k:
+            lines = result[0] + [{'cutShort': [], 'topK': [job['jobURL'] for job in result[0]]}]
+        else:
+            lines = result[0] + [{'cutShort': []}]
+        return StreamingResponse((json.dumps(line) + '\n' for line in lines), media_type='application/x-ndjson')
+
+    deadline = Deadline(REQUEST_BUDGET)
+    try:
+        urls = await deadline.run(create_urls, titles, time_period, location)
+    except DeadlineExceeded:
+        urls = []
+
+    async def generate():
+        start_time = time.time()
+        jobs = []
+        try:
+            async for job in streamJobs(urls, plavra, deadline, time_period, cards_offset, rating_mode, user_params.top_k, user_params.rank_by, user_params.dedupe, create_prefilter(user_params, time_period), (titles, location)):
+                yield json.dumps(job) + '\n'
+                if 'cutShort' not in job:
+                    jobs.append(job)
+                # only complete searches are cached, not the ones cut by their deadline or by the client
+                elif not job['cutShort']:
+                    # cached in the order of /jobs, which shares the key, best first
+                    jobs = rank_jobs(jobs, user_params.rank_by, user_params.top_k)
+                    await result_cache.aset(cache_key, [jobs, len(jobs)])
+        finally:
+            print(f"Time taken to stream jobs: {time.time() - start_time:.2f} seconds")
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+@app.on_event("startup")
+async def warm_location_cache():
+    """
+    Loads the bundled infojobs location ids of the main Brazilian cities when the worker starts, and resolves the
+    missing ones in the background when JOBS_WARM_LOCATIONS is set.
+    """
+    await seed_locations()
+    if WARM_LOCATIONS:
+        app.state.warm_locations = asyncio.create_task(warm_locations())
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    """
+    Closes the HTTP connection pool shared by the scrapers when the worker stops.
+    """
+    await client.close_client()
+
+
 # Define a GET endpoint that takes a query parameter 'url' and returns the result of extractJobs function
 @app.get("/")
 def home():
@@ -412,29 +797,14 @@ if __name__ == "__main__":
     'https://www.balcaodeempregos.com.br/vagas-por-cargo/recepcionista?criterio=Recepcionista&cidadeEstado='
     ]
 
-    timeout_event = Event()
-    extraction_completed = Event()
-  
-    def stop_extraction():
-        extraction_completed.wait(130)  # Wait for up to 90 seconds for extraction to complete
-        timeout_event.set()
-
-    def perform_extraction():
-        global result
-        result = extractJobs(url_list, plavra, timeout_event, '&f_TPR=r2592000')
-        extraction_completed.set()  # Signal that extraction is complete
-
-
-    extraction_thread = Thread(target=perform_extraction)
-    extraction_thread.start()
-
-    timeout_thread = Thread(target=stop_extraction)
-    timeout_thread.start()
+    async def perform_extraction():
+        # Stop the scrapers if the extraction takes longer than 130 seconds
+        deadline = Deadline(130)
+        return await extractJobs(url_list, plavra, deadline, '&f_TPR=r2592000')
 
-    extraction_thread.join()  # Wait for extraction_thread to finish
-    timeout_thread.join()  # Wait for timeout_thread to finish
+    result = asyncio.run(perform_extraction())
     
-    #ress = extractJobs(url_list, plavra, timeout_event)
+    #ress = extractJobs(url_list, plavra, deadline)
     
     elapsed_time = time.time() - start_time
     
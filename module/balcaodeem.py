@@ -7,19 +7,24 @@ Developer: Irfan Ahmad, devirfan.mlka@gmail.com
 Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
 """
 
-from bs4 import BeautifulSoup, element
+from bs4 import BeautifulSoup, SoupStrainer, element
 from typing import Optional, List, Union
 
 from woocommerce import API
-from module.docsim import rate_text, normalize_text, date_category
+from module.docsim import normalize_text, date_category
+from module import client
+from module.scheduler import scheduler
+from module.pagination import paginate, set_query_param
+from module.parser import make_soup, select_text
+from module.cache import description_cache, description_key, single_flight
+from module.scraper import Scraper
 from itertools import repeat
 from math import sqrt
 
-from concurrent.futures import ThreadPoolExecutor
-from threading import Event, Thread
+from module.deadline import Deadline
 
 import os
-import requests
+import asyncio
 import json
 import re
 import time
@@ -28,17 +33,16 @@ import logging
 import unicodedata
 
 
-requests.adapters.DEFAULT_RETRIES = 3
 headers = {'user-agent':'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36'}
 
-class Balca:
+class Balca(Scraper):
     """
     A class to scrape and process job listings from 'https://www.balcaodeempregos.com.br/'.
 
     Attributes:
         urls (list): A list of URLs to scrape job listings from.
         palavras (list): A list of keywords to rate the job listings.
-        timeout_event (Event): A threading.Event to signal when the scraping should be stopped.
+        deadline (Deadline): The deadline of the scraper, no page is fetched after it has passed.
         time_period (Optional[str]): Time period filter for the job listings.
         card_num (int): The maximum number of job cards to retrieve.
 
@@ -46,8 +50,8 @@ class Balca:
         parse_cards_url(url: str) -> List[Dict[str, str]]:
             Parses job cards from the provided URL and returns a list of job card elements.
 
-        get_job_cards(cards: List, url: str) -> List[Dict[str, str]]:
-            Recursively fetches job cards and adds them to the cards list.
+        get_job_cards(url: str) -> Tuple[List[element.Tag], int]:
+            Fetches the job cards of one result page and the total number of result pages.
 
         get_job_info(card: element.Tag) -> Optional[Dict[str, Union[str, int]]]:
             Extracts job information from a job card element and returns a dictionary with the relevant data.
@@ -55,23 +59,26 @@ class Balca:
         extractDescription(url: str, job_id: str) -> Optional[str]:
             Extracts job description from the provided job posting URL.
 
+        stream() -> AsyncIterator[Dict[str, Union[str, int]]]:
+            Yields each job posting as soon as its description is rated.
+
         main() -> Tuple[List[Dict[str, Union[str, int]]], int]:
             The main function that orchestrates the scraping and processing of job listings.
     """
     
-    def __init__(self, urls:list, palavras, timeout_event: Event, time_period=None, card_num=10):
+    # site name used by the scheduler limits
+    site = 'balca'
+
+    def __init__(self, urls:list, palavras, deadline: Deadline, time_period=None, card_num=10):
         self.urls = urls
         self.palavras = palavras
         self.time_period = time_period
         if time_period:
             self.time_period = time_period.split('=r')[-1]
-        self.timeout_event = timeout_event
+        self.deadline = deadline
         self.card_num = card_num
         
-        self.total_pages = 1
-        self.page_index = 1
-        
-    def parse_cards_url(self, url):
+    async def parse_cards_url(self, url):
         """
         Parses job cards from the provided URL and returns a list of job card elements.
 
@@ -82,60 +89,55 @@ class Balca:
             list: A list of job card elements.
         """
         
-        cards = []
-        cards = self.get_job_cards(cards, url)
-        if len(cards)>self.card_num:
-            return cards[0:self.card_num]
-        return cards
+        return await paginate(url, self.get_job_cards, self.page_url, self.card_num)
+
+    @staticmethod
+    def page_url(url, page):
+        """
+        Returns the URL of a result page of the search URL.
+        """
+        return set_query_param(url, 'pagina', page)
     
     
-    def get_job_cards(self, cards:list, url):
+    async def get_job_cards(self, url):
         """
-        Recursively fetches job cards and adds them to the cards list.
+        Fetches the job cards of one result page.
 
         Args:
-            cards (list): The list of job cards to append to.
             url (str): The URL to scrape job cards from.
 
         Returns:
-            list: The list of job cards.
+            tuple: The list of job cards of the page and the total number of result pages.
         """
         
-        if self.timeout_event.is_set():
-            return cards
+        cards = []
+        total_pages = 1
+        if self.deadline.expired():
+            return cards, total_pages
             
         print('===========>Getting cards for: ', url)
         try:
-            res = requests.get(url, headers=headers)
+            res = await client.get(url, headers=headers)
             if res.status_code==200:
-                time.sleep(.5)
                 html = res.content
       
-                soup = BeautifulSoup(html, "html.parser")
+                soup = make_soup(html, SoupStrainer(['ul', 'fieldset']))
             
-                if '?pagina=' not in url:
-                    total_pages_element = soup.find('ul', class_='pagination')
-                    if total_pages_element:
-                        self.total_pages = len(total_pages_element.find_all('li'))
+                total_pages_element = soup.find('ul', class_='pagination')
+                if total_pages_element:
+                    total_pages = len(total_pages_element.find_all('li'))
 
                 cards_list = soup.find('fieldset')
                 # get cards
       
                 if cards_list:
-                    cards.extend(cards_list.find_all('div', class_='panel-body panel-vaga link-draw-vaga'))
-                
-                if len(cards) >= self.card_num:
-                    return cards
-                                    
-                if self.total_pages > self.page_index:
-                    self.page_index += 1
-                    self.get_job_cards(cards, url.replace('?', f'?pagina={self.page_index}&'))
-                else:
-                    return cards
-        except:
-            return cards
+                    cards = cards_list.find_all('div', class_='panel-body panel-vaga link-draw-vaga')
+        except Exception as e:
+            print('Error while getting job cards: ', e)
+
+        return cards, total_pages
     
-    def get_job_info(self, card):
+    async def get_job_info(self, card):
         """
         Extracts job information from a job card element and returns a dictionary with the relevant data.
 
@@ -146,7 +148,7 @@ class Balca:
             Optional[dict]: A dictionary with job information, or None if the time_period condition is not met.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return {}
                         
         job_secs = card.find_all('div', recursive=False)
@@ -180,30 +182,18 @@ class Balca:
         
         job_response_url = f"https://www.balcaodeempregos.com.br/Vaga/GetVagaById"
 
-        job_desc = self.extractDescription(job_response_url, job_id=job_id)
+        if not self.admits_card(job_title, company_name, location, description_url if href_match else None, day_posted=day_posted):
+            return
 
+        # the description of a job found by a recent search is not downloaded again, the store keys it by its page
+        stored = await self.stored_description(description_url if href_match else None)
+        job_desc = stored or await self.extractDescription(job_response_url, job_id=job_id)
 
-        rating = 0
-        if job_desc is not None:
-            try:
-                rating = rate_text(normalize_text(job_desc), self.palavras)
-            except:
-                rating = '---'
-
-            job = {
-        "jobTitle": normalize_text(job_title),
-        "companyName": normalize_text(company_name),
-        "dayPosted": day_posted,
-        "jobURL": description_url,
-        'rating': rating,
-        'location': normalize_text(location)
-            }
-
-            print('JOB: ', json.dumps(job, indent=2))
-            return job
+        return self.make_job(job_desc, normalize_text(job_title), normalize_text(company_name), day_posted, description_url, normalize_text(location), stored=bool(stored))
 
 
-    def extractDescription(self, url, job_id):
+    @single_flight(lambda self, url, job_id: description_key('balca', job_id))
+    async def extractDescription(self, url, job_id):
         """
         Extracts job description from the provided job posting URL.
 
@@ -215,15 +205,22 @@ class Balca:
             Optional[str]: The job description or None if an error occurs.
         """
         
+        cache_key = description_key('balca', job_id)
+        description = await description_cache.aget(cache_key)
+        if description is not None:
+            return description
+        
         try:
             data = {
                 "id": job_id
             }
-            res = requests.post(url, headers=headers, data=data)
+            res = await client.post(url, headers=headers, data=data)
             if res.status_code == 200:
                 description_page_info = {}
                 html = res.json()
                 description = html['vaga']['Descricao']
+                if description is not None:
+                    await description_cache.aset(cache_key, description)
                 return description
 
         except Exception as e:
@@ -231,7 +228,19 @@ class Balca:
             return None
             
         
-    def main(self):
+    async def stream(self):
+        """
+        Fetches the job cards and yields each job posting as soon as its description is rated.
+        Cards are queued for their description as soon as their own page is parsed.
+
+        Yields:
+            dict: A dictionary with the job details.
+        """
+        
+        async for job in scheduler.pipeline(self.site, self.urls, self.parse_cards_url, self.get_job_info, self.deadline, self.ranking):
+            yield job
+
+    async def main(self):
         """
         The main function that orchestrates the scraping and processing of job listings.
 
@@ -240,40 +249,7 @@ class Balca:
         """
         
         try:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                cards = executor.map(self.parse_cards_url, self.urls)
-
-            cards = list(cards)
-            print('//////////////////////')
-            print('Totla Balcaodeem Cards: ', len([crd for card in cards for crd in card]))
-            print('//////////////////////')
-
-            if len(cards) ==0:
-                return [[], 0]
-
-            results = []
-            
-            jobs_data_list = []
-            
-            for card in cards:
-                if self.timeout_event.is_set():
-                    break
-                if len(card)>0:
-                    root = sqrt(len(card))
-                    if root >=1:
-                        if root > 10:
-                            workers = round(sqrt(len(card)))
-                        else:
-                            workers = len(card)
-                    else:
-                        workers = 1
-
-                    with ThreadPoolExecutor(max_workers=workers) as executor:
-                        job_data = executor.map(self.get_job_info, card)
-
-                    jobs_data_list.extend(list(job_data))
-
-            results = [jb for jb in jobs_data_list if jb]
+            results = [job async for job in self.stream()]
     
             total_cards = len(results)
       
@@ -304,17 +280,13 @@ if __name__ == '__main__':
 	'espanhol'
 	]
 	
-    timeout_event = Event()
-    # Start the timeout thread before calling the extractJobs function
-    def stop_extraction():
-        time.sleep(40)
-        timeout_event.set()
-
-    extraction_thread = Thread(target=stop_extraction)
-    extraction_thread.start()
-    
-    balca = Balca(WEBSITE_URL, plavra, timeout_event)
-    jobs = balca.main()
+    async def run_extraction():
+        # Stop the scraper once the time limit is reached
+        deadline = Deadline(40)
+        balca = Balca(WEBSITE_URL, plavra, deadline)
+        return await balca.main()
+
+    jobs = asyncio.run(run_extraction())
 
     print('=+=+=+=+=+=+=+=+==+=+=+=++==+==++=+==+=+=+=+=+=+=+=+=+=+==+=+=+')
     print(json.dumps(jobs, indent=2))
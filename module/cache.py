@@ -0,0 +1,342 @@
+"""
+This module provides the caches used to avoid scraping the same data again for every request.
+
+A TTLCache keeps entries in memory for a limited time and evicts the least recently used entries once it is full.
+It can be backed by a SQLiteCache stored in a file, so that the gunicorn workers of the same host share their entries.
+The coroutines use aget() and aset(), which only read and write the file in a worker thread, so a busy file never
+blocks the event loop. The file is cleaned of its expired and least recently used entries every JOBS_CACHE_EVICT_EVERY
+writes rather than on each of them.
+
+The main classes and functions are:
+1. TTLCache(maxsize, ttl, backend): In-memory LRU cache with expiring entries and hit/miss counters, with get()/set()
+   and the coroutines aget()/aset().
+2. SQLiteCache(path, table, maxsize, ttl): Cache shared between processes through a SQLite file.
+3. create_cache(name, maxsize, ttl): Create a TTLCache, backed by SQLite when JOBS_CACHE_PATH is set.
+4. make_key(*parts): Build a stable cache key from JSON serializable parts.
+5. description_key(site, job_id): Build the description_cache key of a job posting.
+6. SingleFlight / single_flight(key_func): Share one in-flight call between concurrent callers asking for the same key.
+
+The module also creates description_cache, shared by all scrapers so that a job posting found by several searches
+is downloaded once and only rescored against the keywords of each search.
+
+Settings (environment variables):
+    JOBS_CACHE_PATH: Path of the SQLite file shared by the workers. Caches are kept in memory only when it is not set.
+    JOBS_CACHE_EVICT_EVERY: Number of writes to a cache of the SQLite file between two evictions (default 100).
+    JOBS_DESCRIPTION_CACHE_TTL: Number of seconds a job description is kept (default 6 hours).
+    JOBS_DESCRIPTION_CACHE_SIZE: Maximum number of job descriptions kept (default 5000).
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+from collections import OrderedDict
+
+import os
+import asyncio
+import functools
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from module.deadline import current_deadline, without_deadline
+
+
+CACHE_PATH = os.environ.get('JOBS_CACHE_PATH')
+CACHE_EVICT_EVERY = int(os.environ.get('JOBS_CACHE_EVICT_EVERY', 100))
+DESCRIPTION_CACHE_TTL = int(os.environ.get('JOBS_DESCRIPTION_CACHE_TTL', 6 * 3600))
+DESCRIPTION_CACHE_SIZE = int(os.environ.get('JOBS_DESCRIPTION_CACHE_SIZE', 5000))
+
+
+def make_key(*parts) -> str:
+    """
+    Build a stable cache key from JSON serializable parts.
+
+    Parameters:
+    *parts: The values identifying the cached entry.
+
+    Returns:
+    str: A hexadecimal digest of the canonical JSON form of the parts.
+    """
+    canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class SQLiteCache:
+    """
+    A cache stored in a SQLite file, shared by every process that opens the same file.
+
+    Attributes:
+        path (str): Path of the SQLite database file.
+        table (str): Name of the table holding the entries of this cache.
+        maxsize (int): Maximum number of entries kept in the table, exceeded by at most evict_every entries.
+        ttl (float): Number of seconds an entry stays valid.
+        evict_every (int): Number of writes between two evictions.
+    """
+
+    def __init__(self, path: str, table: str, maxsize: int, ttl: float, evict_every: int = CACHE_EVICT_EVERY):
+        self.path = path
+        self.table = table
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.evict_every = max(1, evict_every)
+        self.writes = 0
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT, expires REAL, accessed REAL)'
+        )
+        self.connection.execute(f'CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)')
+
+    def get(self, key: str):
+        """
+        Return the value stored for key, or None if it is missing or expired.
+        """
+        now = time.time()
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    f'SELECT value FROM {self.table} WHERE key = ? AND expires > ?', (key, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                self.connection.execute(f'UPDATE {self.table} SET accessed = ? WHERE key = ?', (now, key))
+            return json.loads(row[0])
+        except sqlite3.Error as e:
+            logging.error('Error while reading the %s cache: %s', self.table, str(e))
+            return None
+
+    def set(self, key: str, value, ttl: float = None):
+        """
+        Store value for key, and evict the expired and least recently used entries every evict_every writes.
+        """
+        now = time.time()
+        expires = now + (ttl if ttl is not None else self.ttl)
+        try:
+            with self.lock:
+                self.connection.execute(
+                    f'INSERT OR REPLACE INTO {self.table} (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+                    (key, json.dumps(value), expires, now)
+                )
+                self.writes += 1
+                if self.writes % self.evict_every == 0:
+                    self._evict(now)
+        except sqlite3.Error as e:
+            logging.error('Error while writing the %s cache: %s', self.table, str(e))
+
+    def _evict(self, now: float):
+        # called with the lock held
+        self.connection.execute(f'DELETE FROM {self.table} WHERE expires <= ?', (now,))
+        self.connection.execute(
+            f'DELETE FROM {self.table} WHERE key IN '
+            f'(SELECT key FROM {self.table} ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+            (self.maxsize,)
+        )
+
+
+class TTLCache:
+    """
+    An in-memory cache with expiring entries and least recently used eviction.
+
+    Attributes:
+        maxsize (int): Maximum number of entries kept in memory.
+        ttl (float): Number of seconds an entry stays valid.
+        backend (Optional[SQLiteCache]): A shared cache consulted on misses and updated on writes.
+        hits (int): Number of lookups answered by the cache.
+        misses (int): Number of lookups that were not found or expired.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 600, backend: SQLiteCache = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """
+        Return the value stored for key, or None if it is missing or expired.
+        """
+        value = self._lookup(key)
+        if value is None and self.backend is not None:
+            value = self._found(key, self.backend.get(key))
+        return self._count(value)
+
+    async def aget(self, key: str):
+        """
+        Same as get(), reading the shared backend in a worker thread.
+        """
+        value = self._lookup(key)
+        if value is None and self.backend is not None:
+            value = self._found(key, await asyncio.to_thread(self.backend.get, key))
+        return self._count(value)
+
+    def set(self, key: str, value, ttl: float = None):
+        """
+        Store value for key, in memory and in the shared backend if there is one.
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        self._store(key, value, ttl)
+        if self.backend is not None:
+            self.backend.set(key, value, ttl)
+
+    async def aset(self, key: str, value, ttl: float = None):
+        """
+        Same as set(), writing the shared backend in a worker thread.
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        self._store(key, value, ttl)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.set, key, value, ttl)
+
+    def _lookup(self, key: str):
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self.entries.move_to_end(key)
+                return value
+            del self.entries[key]
+        return None
+
+    def _found(self, key: str, value):
+        # a value of the shared backend is kept in memory for the next lookups
+        if value is not None:
+            self._store(key, value, self.ttl)
+        return value
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _store(self, key: str, value, ttl: float):
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Return the size and hit/miss counters of the cache.
+        """
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def create_cache(name: str, maxsize: int, ttl: float) -> TTLCache:
+    """
+    Create a TTLCache, backed by the shared SQLite file when JOBS_CACHE_PATH is set.
+
+    Parameters:
+    name (str): Name of the cache, used as the SQLite table name.
+    maxsize (int): Maximum number of entries.
+    ttl (float): Number of seconds an entry stays valid.
+
+    Returns:
+    TTLCache: The cache.
+    """
+    backend = None
+    if CACHE_PATH:
+        try:
+            backend = SQLiteCache(CACHE_PATH, name, maxsize, ttl)
+        except sqlite3.Error as e:
+            logging.error('Error while opening the shared cache %s: %s', CACHE_PATH, str(e))
+
+    return TTLCache(maxsize, ttl, backend)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into a single in-flight call whose result is shared.
+
+    While a call for a key is running, later callers for the same key wait for it instead of starting
+    their own. The entry is removed once the call finishes, so caching the result is left to the caller.
+
+    Attributes:
+        calls (dict): The running tasks by key.
+        shared (int): Number of calls answered by joining a call already in flight.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.shared = 0
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Await func(*args, **kwargs), or the call already running for key.
+
+        A caller that is cancelled does not cancel the shared call for the other callers. The shared call runs
+        without the deadline of the caller that started it, and each caller stops waiting at its own deadline.
+
+        Raises:
+        DeadlineExceeded: If the deadline of the caller passed before the shared call finished.
+        """
+        task = self.calls.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(without_deadline(func, *args, **kwargs))
+            self.calls[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+        else:
+            self.shared += 1
+
+        deadline = current_deadline()
+        if deadline is None:
+            return await asyncio.shield(task)
+        return await deadline.run(asyncio.shield, task)
+
+    def _done(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # mark the exception as retrieved when every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+def single_flight(key_func):
+    """
+    Decorate a coroutine function so that concurrent calls with the same key share one call.
+
+    Parameters:
+    key_func (callable): Receives the arguments of the decorated function and returns the key of the call.
+
+    Returns:
+    callable: The decorator.
+    """
+    def decorator(func):
+        flight = SingleFlight()
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await flight.do(key_func(*args, **kwargs), func, *args, **kwargs)
+
+        wrapper.flight = flight
+        return wrapper
+
+    return decorator
+
+
+def description_key(site: str, job_id: str) -> str:
+    """
+    Build the description_cache key of a job posting.
+
+    The query string is dropped from URLs because it only carries search tracking parameters
+    that change between searches for the same posting.
+
+    Parameters:
+    site (str): Name of the site the posting comes from.
+    job_id (str): URL or site specific id of the posting.
+
+    Returns:
+    str: The cache key.
+    """
+    return f"{site}:{str(job_id).split('?')[0]}"
+
+
+description_cache = create_cache('descriptions', DESCRIPTION_CACHE_SIZE, DESCRIPTION_CACHE_TTL)
@@ -0,0 +1,214 @@
+"""
+This module provides the HTTP client shared by every scraper in the process.
+
+All requests go through one httpx.AsyncClient so that connections to the same host are kept alive and reused
+between card pages and job descriptions instead of paying a new TCP and TLS handshake for every fetch.
+The number of open connections is bounded globally and per host, requests are paced by the per-host token
+buckets of module.ratelimit, and failed requests are retried with exponential backoff.
+Requests sent within a module.deadline.Deadline never wait past it: the timeout of every attempt is cut to the time
+left and no retry is started once the deadline is too close.
+
+The main functions are:
+1. get_client(): Return the process-wide httpx.AsyncClient, creating it on first use.
+2. request(method, url, **kwargs): Send a request through the shared client with per-host limits and retries.
+   Concurrent GET requests for the same URL share a single request and its response.
+3. get(url, **kwargs) / post(url, **kwargs): Shortcuts for request('GET', ...) and request('POST', ...).
+4. close_client(): Close the shared client and its connection pool.
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+import os
+import asyncio
+import random
+import logging
+
+import httpx
+
+from module.cache import SingleFlight
+from module.ratelimit import rate_limiter
+from module.deadline import DeadlineExceeded, current_deadline
+
+
+headers = {'user-agent':'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36'}
+
+MAX_CONNECTIONS = int(os.environ.get('JOBS_MAX_CONNECTIONS', 100))
+MAX_CONNECTIONS_PER_HOST = int(os.environ.get('JOBS_MAX_CONNECTIONS_PER_HOST', 10))
+KEEPALIVE_EXPIRY = float(os.environ.get('JOBS_KEEPALIVE_EXPIRY', 30))
+DEFAULT_TIMEOUT = float(os.environ.get('JOBS_HTTP_TIMEOUT', 10))
+
+RETRIES = int(os.environ.get('JOBS_HTTP_RETRIES', 3))
+BACKOFF_FACTOR = float(os.environ.get('JOBS_HTTP_BACKOFF', 0.5))
+BACKOFF_MAX = 8
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_client = None
+_client_loop = None
+_host_slots = {}
+_inflight = SingleFlight()
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the process-wide httpx.AsyncClient, creating it on first use.
+
+    The client is bound to the running event loop, so a new one is created if the loop changes
+    (for example between calls to asyncio.run in the command line entry points).
+
+    Returns:
+    httpx.AsyncClient: The shared client.
+    """
+    global _client, _client_loop
+
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        limits = httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        _client = httpx.AsyncClient(
+            headers=headers,
+            follow_redirects=True,
+            timeout=DEFAULT_TIMEOUT,
+            limits=limits,
+            # retries connection failures inside the transport, before any byte is sent
+            transport=httpx.AsyncHTTPTransport(retries=RETRIES, limits=limits),
+        )
+        _client_loop = loop
+        _host_slots.clear()
+
+    return _client
+
+
+def _host_slot(host: str) -> asyncio.Semaphore:
+    """
+    Return the semaphore limiting the number of concurrent requests to a host.
+
+    Parameters:
+    host (str): The host name of the request.
+
+    Returns:
+    asyncio.Semaphore: The semaphore for the host.
+    """
+    slot = _host_slots.get(host)
+    if slot is None:
+        slot = _host_slots[host] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+    return slot
+
+
+def _backoff(attempt: int, response: httpx.Response = None) -> float:
+    """
+    Compute how long to wait before retrying a request.
+
+    A numeric Retry-After header sent by the server takes precedence over the exponential backoff.
+
+    Parameters:
+    attempt (int): The number of the attempt that just failed, starting at 0.
+    response (httpx.Response): The failed response, if the server answered.
+
+    Returns:
+    float: The number of seconds to wait.
+    """
+    if response is not None:
+        retry_after = response.headers.get('retry-after', '')
+        if retry_after.isdigit():
+            return min(int(retry_after), BACKOFF_MAX)
+
+    delay = BACKOFF_FACTOR * (2 ** attempt)
+    return min(delay + random.uniform(0, BACKOFF_FACTOR), BACKOFF_MAX)
+
+
+async def request(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Send a request through the shared client.
+
+    Requests to the same host share a bounded number of connection slots and wait for a token of the
+    host's rate limiter before every attempt. Timeouts, transport errors
+    and retryable status codes (429 and 5xx) are retried up to RETRIES times with exponential backoff.
+    GET requests without a body are coalesced: while a request for a URL is in flight, other requests
+    for the same URL wait for it and receive the same response instead of fetching the page again.
+    A coalesced request is sent without the deadline of any caller, each caller stops waiting at its own deadline.
+
+    Parameters:
+    method (str): The HTTP method.
+    url (str): The URL to request.
+    **kwargs: Passed to httpx.AsyncClient.request (headers, data, params, timeout...).
+
+    Returns:
+    httpx.Response: The last response received.
+
+    Raises:
+    httpx.TransportError: If the last attempt failed without a response.
+    DeadlineExceeded: If the deadline of the running fetch passed before a response was received.
+    """
+    if method == 'GET' and not any(kwargs.get(name) for name in ('data', 'json', 'content', 'files')):
+        # httpx.URL(url, params=None) drops the query string of url, so params are merged only when given
+        key = str(httpx.URL(url).copy_merge_params(kwargs['params'])) if kwargs.get('params') else str(httpx.URL(url))
+        return await _inflight.do(key, _send, method, url, **kwargs)
+
+    return await _send(method, url, **kwargs)
+
+
+async def _send(method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    Send a request with the per-host limit and the retries described in request().
+    """
+    client = get_client()
+    host = httpx.URL(url).host
+    slot = _host_slot(host)
+    deadline = current_deadline()
+    timeout = kwargs.pop('timeout', DEFAULT_TIMEOUT)
+
+    for attempt in range(RETRIES + 1):
+        response = None
+        try:
+            async with slot:
+                await rate_limiter.wait(host)
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded()
+                attempt_timeout = timeout if deadline is None else min(timeout, deadline.remaining())
+                response = await client.request(method, url, timeout=attempt_timeout, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == RETRIES:
+                return response
+        except httpx.TransportError as e:
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded() from e
+            if attempt == RETRIES:
+                raise
+            logging.info('Retrying %s %s after error: %s', method, url, e)
+
+        delay = _backoff(attempt, response)
+        if deadline is not None and delay >= deadline.remaining():
+            # no time left for another attempt, keep the failed response if there is one
+            if response is not None:
+                return response
+            deadline.exceeded = True
+            raise DeadlineExceeded()
+        await asyncio.sleep(delay)
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    """
+    Send a GET request through the shared client. See request().
+    """
+    return await request('GET', url, **kwargs)
+
+
+async def post(url: str, **kwargs) -> httpx.Response:
+    """
+    Send a POST request through the shared client. See request().
+    """
+    return await request('POST', url, **kwargs)
+
+
+async def close_client():
+    """
+    Close the shared client and its connection pool.
+    """
+    global _client
+
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,121 @@
+"""
+This module propagates the time budget of a search down to every network call.
+
+A search gets a request budget. Each site scraper gets a deadline derived from it, that expires a little earlier so
+that the response can still be assembled, and every fetch runs with the deadline of its site: the HTTP timeout of
+each attempt is cut to the time left and the fetch is cancelled when the deadline passes. A site whose work was cut
+by its deadline is marked as exceeded, so the endpoint can return the jobs that are ready and report the sites that
+were cut short.
+
+The main class and functions are:
+1. Deadline(budget, parent): A point in time by which some work has to be done, never later than its parent.
+2. current_deadline(): Return the deadline of the running fetch, used by module.client.
+3. without_deadline(func, *args, **kwargs): Await a call outside of any deadline, for work shared by several searches.
+4. DeadlineExceeded: Raised when a fetch is cut by its deadline.
+
+Settings (environment variables):
+    JOBS_REQUEST_BUDGET: Number of seconds a search may take (default 75).
+    JOBS_SITE_BUDGET: Number of seconds each site may take, within the request budget (default 70).
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+import os
+import time
+import asyncio
+import contextvars
+
+
+REQUEST_BUDGET = float(os.environ.get('JOBS_REQUEST_BUDGET', 75))
+SITE_BUDGET = float(os.environ.get('JOBS_SITE_BUDGET', 70))
+
+_current = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a fetch is cut by its deadline.
+    """
+
+
+class Deadline:
+    """
+    A point in time by which some work has to be done.
+
+    Attributes:
+        expires (float): time.monotonic() value at which the deadline passes.
+        parent (Optional[Deadline]): The deadline this one was derived from, it never expires later than its parent.
+        exceeded (bool): True once some work was cut or skipped because the deadline had passed.
+    """
+
+    def __init__(self, budget: float, parent: 'Deadline' = None):
+        self.expires = time.monotonic() + budget
+        if parent is not None:
+            self.expires = min(self.expires, parent.expires)
+        self.parent = parent
+        self.exceeded = False
+
+    def child(self, budget: float) -> 'Deadline':
+        """
+        Return a deadline expiring after budget seconds, or with this deadline if it comes first.
+        """
+        return Deadline(budget, self)
+
+    def remaining(self) -> float:
+        """
+        Return the number of seconds left, 0 once the deadline has passed.
+        """
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        """
+        Return True if the deadline has passed, marking it as exceeded.
+
+        It is called before starting some work, so a True result means the work is skipped.
+        """
+        if time.monotonic() >= self.expires:
+            self.exceeded = True
+        return self.exceeded
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Await func(*args, **kwargs) with this deadline, cancelling it when the deadline passes.
+
+        Fetches sent by func through module.client see this deadline and cut their timeouts to the time left.
+
+        Raises:
+        DeadlineExceeded: If the deadline passed before func finished.
+        """
+        if self.expired():
+            raise DeadlineExceeded()
+
+        token = _current.set(self)
+        try:
+            return await asyncio.wait_for(func(*args, **kwargs), self.remaining())
+        except asyncio.TimeoutError:
+            self.exceeded = True
+            raise DeadlineExceeded()
+        finally:
+            _current.reset(token)
+
+
+def current_deadline():
+    """
+    Return the deadline of the running fetch, or None outside of Deadline.run.
+    """
+    return _current.get()
+
+
+async def without_deadline(func, *args, **kwargs):
+    """
+    Await func(*args, **kwargs) outside of any deadline.
+
+    A fetch shared by several searches must not be cut by the deadline of the search that started it; each search
+    stops waiting for it at its own deadline instead.
+    """
+    token = _current.set(None)
+    try:
+        return await func(*args, **kwargs)
+    finally:
+        _current.reset(token)
@@ -0,0 +1,206 @@
+"""
+This module detects the job postings published on several sites, so that a search returns each of them once.
+
+Two stages are used:
+1. The card fields. A key built from the title words, the company and the city of a card is known before its
+   description is fetched, so a card whose key was already seen is skipped without any request.
+2. The description. Titles often differ slightly between the sites, so every description is also reduced to a MinHash
+   signature of its word shingles. Signatures are indexed with locality sensitive hashing (LSH): the signature is
+   split in bands and two descriptions sharing a band are compared, so each new description is only checked against
+   the few candidates that are likely similar instead of every description of the search. Companies reuse the same
+   text for their openings in several cities, so similar descriptions are only the same posting when they are in the
+   same city and their company or their title match.
+
+The main class and functions are:
+1. Deduper(threshold): The postings of one search, with claim() and release() for the cards and is_duplicate() for
+   the descriptions.
+2. card_key(title, company, location): The key of a card, None when its company is unknown.
+   card_fields(title, company, location) returns the title, company and city it is built from.
+3. minhash(words): The MinHash signature of the shingles of a text.
+
+Settings (environment variables):
+    JOBS_DEDUPE_THRESHOLD: Estimated Jaccard similarity above which two descriptions are the same posting (default 0.8).
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+from module.docsim import tokenize
+
+import os
+import re
+import zlib
+import unicodedata
+import numpy as np
+
+
+DEDUPE_THRESHOLD = float(os.environ.get('JOBS_DEDUPE_THRESHOLD', 0.8))
+
+# number of words of a shingle
+SHINGLE_SIZE = 3
+# 16 bands of 4 rows: descriptions about 50% similar or more share a band most of the time
+BANDS = 16
+ROWS = 4
+PERMUTATIONS = BANDS * ROWS
+
+# the permutations are the universal hash functions (a * x + b) mod MERSENNE_PRIME of the 32 bit shingle hashes
+MERSENNE_PRIME = (1 << 61) - 1
+_random = np.random.RandomState(20230601)
+_A = _random.randint(1, 1 << 32, PERMUTATIONS, dtype=np.uint64)
+_B = _random.randint(0, 1 << 32, PERMUTATIONS, dtype=np.uint64)
+
+# words left out of the card keys
+STOP_WORDS = frozenset({'a', 'o', 'e', 'de', 'da', 'do', 'das', 'dos', 'em', 'para', 'com'})
+COMPANY_SUFFIXES = frozenset({'ltda', 'sa', 's', 'a', 'me', 'eireli', 'epp', 'inc', 'ltd'})
+UNKNOWN_COMPANIES = frozenset({'', 'not specified', 'nao informado', 'confidencial'})
+LOCATION_SEPARATOR = re.compile(r'\s*[,\-/]\s*')
+
+
+def fold(text: str) -> list:
+    """
+    Return the words of a card field without accents, so that "Sênior" and "Senior" match.
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    return tokenize(''.join(char for char in text if not unicodedata.combining(char)))
+
+
+def card_fields(title: str, company: str, location: str) -> tuple:
+    """
+    Return the title words, the company and the city of a card, ignoring case, accents, punctuation and the order of
+    the title words.
+    """
+    company = ' '.join(word for word in fold(company) if word not in COMPANY_SUFFIXES)
+    title = ' '.join(sorted(set(fold(title)) - STOP_WORDS))
+    city = ' '.join(fold(LOCATION_SEPARATOR.split((location or '').strip())[0]))
+    return title, company, city
+
+
+def card_key(title: str, company: str, location: str):
+    """
+    Build the key of a card from its fields, ignoring case, accents, punctuation and the order of the title words.
+
+    Parameters:
+    title (str): The job title.
+    company (str): The company name.
+    location (str): The location, only its first part (the city) is used.
+
+    Returns:
+    Optional[str]: The key, or None when the company is unknown and the card cannot be matched on its fields.
+    """
+    if not title:
+        return None
+    title, company, city = card_fields(title, company, location)
+    if company in UNKNOWN_COMPANIES:
+        return None
+    return f'{title}|{company}|{city}'
+
+
+def minhash(words: list):
+    """
+    Return the MinHash signature of the word shingles of a text.
+
+    Parameters:
+    words (list): The words of the text.
+
+    Returns:
+    Optional[numpy.ndarray]: PERMUTATIONS minimum hashes, or None if the text is shorter than a shingle.
+    """
+    if len(words) < SHINGLE_SIZE:
+        return None
+
+    shingles = {' '.join(words[index:index + SHINGLE_SIZE]) for index in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+    # a * x + b stays below 2^64 for 32 bit a, b and x
+    return ((np.outer(_A, hashes) + _B[:, None]) % MERSENNE_PRIME).min(axis=1)
+
+
+def same_posting(fields: tuple, other: tuple) -> bool:
+    # the same opening of a company in another city shares its text, but is another posting; in the same city the
+    # company name may be written differently by the sites, or the title
+    title, company, city = fields
+    other_title, other_company, other_city = other
+    if city != other_city:
+        return False
+    return company == other_company or bool(title) and title == other_title
+
+
+class Deduper:
+    """
+    The job postings found by one search, shared by the scrapers of every site.
+
+    Attributes:
+        threshold (float): Estimated Jaccard similarity above which two descriptions are the same posting.
+        cards (set): The keys of the cards claimed so far.
+        signatures (list): The MinHash signatures of the descriptions kept so far.
+        fields (list): The card_fields of the job of each signature.
+        buckets (list): One dictionary per band, from the band of a signature to the indexes of the signatures.
+        duplicates (int): Number of postings dropped as duplicates.
+    """
+
+    def __init__(self, threshold: float = DEDUPE_THRESHOLD):
+        self.threshold = threshold
+        self.cards = set()
+        self.signatures = []
+        self.fields = []
+        self.buckets = [{} for _ in range(BANDS)]
+        self.duplicates = 0
+
+    def claim(self, title: str, company: str, location: str) -> bool:
+        """
+        Claim a card before its description is fetched.
+
+        Returns:
+        bool: False if a card with the same fields was already claimed, so this one is a duplicate.
+        """
+        key = card_key(title, company, location)
+        if key is None:
+            return True
+        if key in self.cards:
+            self.duplicates += 1
+            return False
+        self.cards.add(key)
+        return True
+
+    def release(self, title: str, company: str, location: str):
+        """
+        Release a card claimed before its description was fetched, when no job was made from it, so that the same
+        posting found on another site is not dropped as a duplicate.
+        """
+        key = card_key(title, company, location)
+        if key is not None:
+            self.cards.discard(key)
+
+    def is_duplicate(self, description: str, title: str = None, company: str = None, location: str = None) -> bool:
+        """
+        Return True if the description is a near duplicate of a description seen before for the same posting,
+        otherwise index it.
+
+        Parameters:
+        description (str): The job description.
+        title, company, location (Optional[str]): The fields of the card. A similar description is the same posting
+            only when the cities match, and the companies or the titles do.
+        """
+        fields = card_fields(title, company, location)
+        signature = minhash(tokenize(description or ''))
+        if signature is None:
+            return False
+
+        bands = [signature[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+        candidates = set()
+        for buckets, band in zip(self.buckets, bands):
+            candidates.update(buckets.get(band, ()))
+
+        for candidate in candidates:
+            if not same_posting(self.fields[candidate], fields):
+                continue
+            if np.mean(self.signatures[candidate] == signature) >= self.threshold:
+                self.duplicates += 1
+                return True
+
+        index = len(self.signatures)
+        self.signatures.append(signature)
+        self.fields.append(fields)
+        for buckets, band in zip(self.buckets, bands):
+            buckets.setdefault(band, []).append(index)
+        return False
@@ -4,7 +4,16 @@ This module provides utility functions for text processing and date manipulation
 The main functions are:
 1. normalize_text(text): Normalize a given text using the NFC Unicode normalization form.
 2. date_category(date_str): Determine the date category for a given date string in Portuguese format.
+   parse_date(date_str, today) parses the known formats without dateutil.
 3. rate_text(text, plavra): Calculate a rating score for a given text based on the cumulative frequency of words in a list within the text.
+4. KeywordMatcher(keywords): Count the occurrences of a list of words and phrases in a text in one pass, built once per search.
+5. rate_texts(texts, plavra): Rate many texts with the same keywords.
+6. score_counts(plavra_text_count, text_count, matcher): Rate keyword counts with the "ratio", "bm25" or "tfidf" mode,
+   weighting keywords with corpus_stats, the CorpusStats of every description seen by the process.
+
+Settings (environment variables):
+    JOBS_CORPUS_SEEN_SIZE: Number of recent descriptions remembered by corpus_stats so that a description rated again
+        is not counted twice (default 50000).
 
 Developer: Irfan Ahmad, devirfan.mlka@gmail.com
 Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
@@ -13,6 +22,11 @@ Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
 
 import re
 import unicodedata
+from functools import lru_cache
+from collections import Counter, OrderedDict
+import os
+import math
+import threading
 from datetime import datetime, timedelta, date
 from dateutil import parser
 
@@ -29,12 +43,71 @@ def normalize_text(text):
     """
     return unicodedata.normalize('NFC', text)
 
+# Portuguese month abbreviations
+PT_MONTHS = {
+    'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4, 'mai': 5, 'jun': 6,
+    'jul': 7, 'ago': 8, 'set': 9, 'out': 10, 'nov': 11, 'dez': 12,
+}
+# days before today of the relative dates
+PT_RELATIVE_DAYS = {'hoje': 0, 'ontem': 1}
+
+# 2023-05-01, optionally followed by a time
+ISO_DATE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})(?:[t ][\d:.]+z?)?$')
+# 01/05/23, 01/05/2023 or 01/05
+NUMERIC_DATE = re.compile(r'^(\d{1,2})/(\d{1,2})(?:/(\d{4}|\d{2}))?$')
+# 1 mai, 01 de mai. de 2023, 1 maio 2023
+MONTH_DATE = re.compile(r'^(\d{1,2})\s+(?:de\s+)?([a-zç]{3})[a-zç]*\.?(?:\s+(?:de\s+)?(\d{4}))?$')
+
+
+def parse_date(date_str: str, today: date):
+    """
+    Parse the date formats used by the job sites without dateutil.
+
+    Parameters:
+    date_str (str): The lowercased and stripped date string.
+    today (date): The current date, used for relative dates and missing years.
+
+    Returns:
+    Optional[date]: The date, or None if the string matches no known format.
+    """
+    if date_str in PT_RELATIVE_DAYS:
+        return today - timedelta(days=PT_RELATIVE_DAYS[date_str])
+
+    try:
+        match = ISO_DATE.match(date_str)
+        if match:
+            return date(int(match[1]), int(match[2]), int(match[3]))
+
+        match = NUMERIC_DATE.match(date_str)
+        if match:
+            day, month, year = match.groups()
+        else:
+            match = MONTH_DATE.match(date_str)
+            if match is None or match[2] not in PT_MONTHS:
+                return None
+            day, month, year = match[1], PT_MONTHS[match[2]], match[3]
+    except ValueError:
+        return None
+
+    if year is None:
+        year = today.year
+    elif len(year) == 2:
+        year = 2000 + int(year)
+
+    try:
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+
 def date_category(date_str: str) -> str:
     """
     Determine the date category for a given date string.
     
     The input date string should contain a date in Portuguese format.
     The date category is determined based on the difference between the current date and the input date.
+    The formats of the job sites are parsed by parse_date; dateutil is only used for other formats.
+    Results are memoized for the current day.
     
     Parameters:
     date_str (str): The input date string in Portuguese format.
@@ -42,17 +115,41 @@ def date_category(date_str: str) -> str:
     Returns:
     str: The date category as a string representation of seconds ("86400", "604800", "2592000", or "25920000").
     """
-    # Dictionary to map Portuguese month abbreviations to month numbers
-    pt_month_abbr = {
-        'jan': '01', 'fev': '02', 'mar': '03', 'abr': '04',
-        'mai': '05', 'jun': '06', 'jul': '07', 'ago': '08',
-        'set': '09', 'out': '10', 'nov': '11', 'dez': '12',
-        'ontem': (date.today() - timedelta(days=1)).strftime('%d/%m/%y')
-    }
+    return _date_category(date_str, date.today())
 
-    # Replace the Portuguese month abbreviation in the input date string
-    for abbr, number in pt_month_abbr.items():
-        date_str = date_str.lower().replace(abbr, number)
+
+@lru_cache(maxsize=4096)
+def _date_category(date_str: str, today: date) -> str:
+    date_str = date_str.strip().lower()
+
+    input_date = parse_date(date_str, today)
+    if input_date is not None:
+        return _days_category((today - input_date).days)
+
+    return _parse_date_category(date_str)
+
+
+def _days_category(days: int) -> str:
+    # a date without time counts from its midnight, so only today is within the last 24 hours
+    if days < 1:
+        return "86400"
+    elif days < 7:
+        return "604800"
+    elif days < 30:
+        return "2592000"
+    else:
+        return "25920000"
+
+
+def _parse_date_category(date_str: str) -> str:
+    """
+    Determine the date category of a date string that parse_date does not know, with dateutil.
+    """
+    # Replace the Portuguese month abbreviations and relative dates in the input date string
+    for word, days in PT_RELATIVE_DAYS.items():
+        date_str = date_str.replace(word, (date.today() - timedelta(days=days)).strftime('%d/%m/%y'))
+    for abbr, number in PT_MONTHS.items():
+        date_str = date_str.replace(abbr, f'{number:02d}')
 
     # Parse the input date string
     try:
@@ -76,6 +173,222 @@ def date_category(date_str: str) -> str:
     else:
         return "25920000"
 
+# rating modes of rate_text, see score_counts
+RATING_MODES = ('ratio', 'bm25', 'tfidf')
+BM25_K1 = 1.2
+BM25_B = 0.75
+CORPUS_SEEN_SIZE = int(os.environ.get('JOBS_CORPUS_SEEN_SIZE', 50000))
+
+# words of a text, the same tokens as the \b\w+\b pattern
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list:
+    """
+    Split a text into lowercase words.
+    """
+    return WORD.findall(normalize_text(text.lower()))
+
+
+class KeywordMatcher:
+    """
+    Counts the occurrences of a list of words and phrases in a text, in one pass over its words.
+
+    The keywords are tokenized once, so a matcher built for a search can rate every job of it. Single words are
+    counted with a Counter of the text; phrases such as "arquivos de programas" are kept in a token trie and only
+    match their words in sequence.
+
+    Attributes:
+        keywords (list): The words and phrases, in the given order.
+        mode (str): The rating mode of the search, one of RATING_MODES.
+        tokens (list): The words of each keyword.
+        words (dict): The indexes of the single word keywords, by word.
+        phrases (dict): Token trie of the phrases; the None key of a node lists the phrases ending there.
+    """
+
+    def __init__(self, keywords, mode: str = 'ratio'):
+        if mode not in RATING_MODES:
+            raise ValueError(f'Unknown rating mode: {mode}')
+
+        self.keywords = list(keywords or [])
+        self.mode = mode
+        self.tokens = [tokenize(keyword) for keyword in self.keywords]
+        self.words = {}
+        self.phrases = {}
+
+        for index, tokens in enumerate(self.tokens):
+            if len(tokens) == 1:
+                self.words.setdefault(tokens[0], []).append(index)
+            elif tokens:
+                node = self.phrases
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node.setdefault(None, []).append(index)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def count(self, text: str):
+        """
+        Count the occurrences of every keyword in a text.
+
+        Parameters:
+        text (str): The text.
+
+        Returns:
+        Tuple[List[int], int]: The number of occurrences of each keyword and the number of words of the text.
+        """
+        return self.count_words(tokenize(text))
+
+    def count_words(self, words: list):
+        """
+        Count the occurrences of every keyword in the words of a text. See count().
+        """
+        counts = [0] * len(self.keywords)
+        word_count = Counter(words)
+
+        for word, indexes in self.words.items():
+            occurrences = word_count.get(word, 0)
+            for index in indexes:
+                counts[index] += occurrences
+
+        self.count_phrases(words, counts, word_count)
+        return counts, len(words)
+
+    def count_phrases(self, words: list, counts: list, word_count: dict):
+        """
+        Add the occurrences of the phrases in a list of words to counts.
+
+        The trie is only walked from the positions of the words starting a phrase.
+
+        Parameters:
+        words (List[str]): The words of the text.
+        counts (List[int]): The occurrences of each keyword, updated in place.
+        word_count (dict): The number of occurrences of each word in words.
+        """
+        end = len(words)
+        for first, root in self.phrases.items():
+            start = -1
+            for _ in range(word_count.get(first, 0)):
+                start = words.index(first, start + 1)
+                node = root
+                position = start + 1
+                while node is not None and position < end:
+                    node = node.get(words[position])
+                    position += 1
+                    if node is not None:
+                        for index in node.get(None, ()):
+                            counts[index] += 1
+
+
+@lru_cache(maxsize=64)
+def keyword_matcher(keywords: tuple, mode: str = 'ratio') -> KeywordMatcher:
+    """
+    Return a KeywordMatcher for a tuple of keywords, reusing the matchers built before.
+    """
+    return KeywordMatcher(keywords, mode)
+
+
+class CorpusStats:
+    """
+    Document statistics of every job description rated by the process, updated incrementally.
+
+    Used by the "bm25" and "tfidf" rating modes to weight the keywords by how rare they are. Every description rated
+    is counted, whatever the rating mode of its search, so the statistics do not depend on the modes asked for.
+    A description is only counted once while it is among the last seen_size descriptions, however many searches
+    rate it.
+
+    Attributes:
+        documents (int): Number of descriptions seen.
+        words (int): Total number of words of the descriptions seen.
+        document_frequency (Counter): Number of descriptions containing each word.
+        seen (OrderedDict): Hashes of the last seen_size descriptions, the least recently seen first.
+    """
+
+    def __init__(self, seen_size: int = CORPUS_SEEN_SIZE):
+        self.documents = 0
+        self.words = 0
+        self.document_frequency = Counter()
+        self.seen = OrderedDict()
+        self.seen_size = seen_size
+        self.lock = threading.Lock()
+
+    def add(self, words: list):
+        """
+        Add the words of a description to the statistics, unless it was already added.
+        """
+        key = hash(tuple(words))
+        with self.lock:
+            if key in self.seen:
+                self.seen.move_to_end(key)
+                return
+            self.seen[key] = None
+            if len(self.seen) > self.seen_size:
+                self.seen.popitem(last=False)
+            self.documents += 1
+            self.words += len(words)
+            self.document_frequency.update(set(words))
+
+    def keyword_frequency(self, tokens: list) -> int:
+        """
+        Return the document frequency of a keyword. A phrase is at most as frequent as its rarest word,
+        which is used as its frequency.
+        """
+        return min((self.document_frequency.get(token, 0) for token in tokens), default=0)
+
+    def average_length(self) -> float:
+        """
+        Return the average number of words of the descriptions seen.
+        """
+        return self.words / self.documents if self.documents else 0.0
+
+
+corpus_stats = CorpusStats()
+
+
+def score_counts(plavra_text_count: list, text_count: int, matcher: KeywordMatcher) -> dict:
+    """
+    Compute the rating dictionary of a text from its keyword counts with the rating mode of the matcher.
+
+    Modes:
+        ratio: keyword hits / (plavra_count * text_count) * 1000, the original rating.
+        bm25: Okapi BM25 of the keywords, with BM25_K1 and BM25_B, over the corpus_stats documents.
+        tfidf: sum of keyword frequency in the text times smoothed inverse document frequency, * 1000.
+
+    Parameters:
+    plavra_text_count (List[int]): The occurrences of each keyword in the text.
+    text_count (int): The number of words of the text.
+    matcher (KeywordMatcher): The keywords and rating mode.
+
+    Returns:
+    dict: A dictionary containing various counts and the final rating.
+    """
+    sum_plavra_text_count = sum(plavra_text_count)
+    plavra_count = len(matcher)
+
+    if matcher.mode == 'ratio' or text_count == 0:
+        # Normalize the rating by dividing it by the product of plavra_count and text_count
+        normalized_rating = sum_plavra_text_count / (plavra_count * text_count) if plavra_count * text_count != 0 else 0
+        rating = normalized_rating * 1000
+
+    else:
+        documents = max(corpus_stats.documents, 1)
+        rating = 0.0
+        for tokens, frequency in zip(matcher.tokens, plavra_text_count):
+            if not frequency:
+                continue
+            document_frequency = corpus_stats.keyword_frequency(tokens)
+            if matcher.mode == 'bm25':
+                idf = math.log(1 + (documents - document_frequency + 0.5) / (document_frequency + 0.5))
+                length_norm = 1 - BM25_B + BM25_B * text_count / (corpus_stats.average_length() or text_count)
+                rating += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * length_norm)
+            else:
+                idf = math.log((1 + documents) / (1 + document_frequency)) + 1
+                rating += frequency / text_count * idf * 1000
+
+    return {'plavra_count': plavra_count, 'text_count': text_count, 'plavra_text_count': plavra_text_count, 'sum_plavra_text_count': sum_plavra_text_count, 'rating': round(rating, 4)}
+
+
 def rate_text(text, plavra=False):
     """
     Calculate a rating score for a given text based on the cumulative frequency of words in plavra within the text.
@@ -84,7 +397,8 @@ def rate_text(text, plavra=False):
 
     Parameters:
     text (str): The input text to be rated.
-    plavra (list): A list of words or phrases to rate the input text.
+    plavra (Union[list, KeywordMatcher]): A list of words or phrases to rate the input text, or a KeywordMatcher
+        built from it once for all the texts of a search.
 
     Returns:
     dict: A dictionary containing various counts and the final rating.
@@ -94,39 +408,32 @@ def rate_text(text, plavra=False):
     # Check if there are any plavras for the user
     if not plavra:
         return rating
-    
-    plavra = normalize_text(' '.join(plavra)).split(' ')
-
-    # Convert the text to lowercase
-    text = normalize_text(text.lower())
-
-    # Tokenize the text by splitting it into words using regex
-    words = re.findall(r'\b\w+\b', text)
-    
-        # Count the occurrences of words in the text
-    word_count = {}
-    for word in words:
-        word_count[word] = word_count.get(word, 0) + 1
-
-    # Calculate the number of times each plavra word appears in the text
-    plavra_text_count = [word_count.get(normalize_text(word.lower()), 0) for word in plavra]
 
-    # Calculate the cumulative sum for all words in the plavra list
-    sum_plavra_text_count = sum(plavra_text_count)
+    matcher = plavra if isinstance(plavra, KeywordMatcher) else keyword_matcher(tuple(plavra))
+    words = tokenize(text)
+    corpus_stats.add(words)
 
-    # Calculate the number of words in the list plavra
-    plavra_count = len(plavra)
+    # Calculate the number of times each plavra word or phrase appears in the text, and the number of words in the text
+    plavra_text_count, text_count = matcher.count_words(words)
 
-    # Calculate the number of words in the text
-    text_count = len(words)
+    return score_counts(plavra_text_count, text_count, matcher)
 
-    # Normalize the rating by dividing it by the product of plavra_count and text_count
-    normalized_rating = sum_plavra_text_count / (plavra_count * text_count) if plavra_count * text_count != 0 else 0
+def rate_texts(texts: list, plavra) -> list:
+    """
+    Rate many texts with the same keywords, with the same results as calling rate_text on each of them.
 
-    # Scale the rating to be between 0 and 5
-    scaled_rating = round(normalized_rating * 1000, 4)
+    The keywords are compiled once for all the texts. Tokenizing the texts takes most of the time, so each text is
+    counted with KeywordMatcher as rate_text does; call it from a worker thread to keep the event loop free.
 
-    # Return the values for plavra_count, text_count, plavra_text_count, and sum_plavra_text_count
-    return {'plavra_count': plavra_count, 'text_count': text_count, 'plavra_text_count': plavra_text_count, 'sum_plavra_text_count': sum_plavra_text_count, 'rating': scaled_rating}
+    Parameters:
+    texts (List[str]): The input texts to be rated.
+    plavra (Union[list, KeywordMatcher]): A list of words or phrases to rate the input texts.
 
+    Returns:
+    List[dict]: The rating dictionary of each text, in the order of texts.
+    """
+    if not plavra:
+        return [0] * len(texts)
 
+    matcher = plavra if isinstance(plavra, KeywordMatcher) else keyword_matcher(tuple(plavra))
+    return [rate_text(text, matcher) for text in texts]
@@ -11,16 +11,22 @@ from bs4 import BeautifulSoup
 from typing import Optional, List, Union
 
 from woocommerce import API
-from module.docsim import rate_text, normalize_text, date_category
+from module.docsim import normalize_text
+from module import client
+from module.scheduler import scheduler
+from module.pagination import paginate, set_query_param
+from module.scraper import Scraper
 from itertools import repeat
 from math import sqrt
+from datetime import datetime, timedelta, timezone
 
-from concurrent.futures import ThreadPoolExecutor
-from threading import Event, Thread
+from module.deadline import Deadline
 
 import os
-import requests
+import asyncio
 import json
+import math
+import orjson
 import re
 import time
 import random
@@ -28,80 +34,132 @@ import logging
 import unicodedata
 
 
-requests.adapters.DEFAULT_RETRIES = 3
 headers = {'user-agent':'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36'}
 
-def get_location(city):
-    location_url = f'https://www.infojobs.com.br/mf-publicarea/api/autocompleteapi/locations?query={city}'
-    res = requests.get(location_url, headers=headers)
-    res = res.json()['suggestions']
-    location_ids = []
-    for data in res:
-        location_ids.append(data['data']['id'])
-    
-    return location_ids
+# largest number of jobs asked for in one API request
+PAGE_LIMIT = 50
 
-class Gupy:
+class Gupy(Scraper):
     """
     A class to scrape and process job listings from 'https://portal.gupy.io/en'.
 
     Attributes:
         urls (list): A list of URLs to scrape job listings from.
         palavras (list): A list of keywords to rate the job listings.
-        timeout_event (Event): A threading.Event to signal when the scraping should be stopped.
+        deadline (Deadline): The deadline of the scraper, no page is fetched after it has passed.
         time_period (Optional[str]): Time period filter for the job listings.
         card_num (int): The maximum number of job cards to retrieve.
 
     Methods:
-        get_job_cards(url: str) -> List[Dict[str, str]]:
-            Fetches job cards from the provided URL and returns a list of job card elements.
+        parse_cards_url(url: str) -> List[Dict[str, str]]:
+            Fetches up to card_num job cards of a search URL, one API page or several pages concurrently.
+
+        get_job_cards(url: str) -> Tuple[List[Dict[str, str]], int]:
+            Fetches the job cards of one API page and the total number of pages.
 
         get_job_info(card: Dict[str, str]) -> Optional[Dict[str, Union[str, int]]]:
             Extracts job information from a job card element and returns a dictionary with the relevant data.
 
+        stream() -> AsyncIterator[Dict[str, Union[str, int]]]:
+            Yields each job posting as soon as its description is rated.
+
         main() -> Tuple[List[Dict[str, Union[str, int]]], int]:
             The main function that orchestrates the scraping and processing of job listings.
     """
     
-    def __init__(self, urls:list, palavras, timeout_event: Event, time_period=None, card_num=10):
+    # site name used by the scheduler limits
+    site = 'gupy'
+
+    def __init__(self, urls:list, palavras, deadline: Deadline, time_period=None, card_num=10):
         self.urls = urls
         self.palavras = palavras
         self.time_period = time_period
         if time_period:
             self.time_period = time_period.split('=r')[-1]
-        self.timeout_event = timeout_event
+        self.published_after = self.window_start(self.time_period)
+        self.deadline = deadline
         self.card_num=card_num
         
-    def get_job_cards(self, url):
+    async def parse_cards_url(self, url):
         """
-        Fetches job cards from the provided URL and returns a list of job card elements.
+        Fetches up to card_num job cards of a search URL.
+        The API is asked for pages of card_num jobs at most (PAGE_LIMIT), and the extra pages needed
+        for a larger card_num are fetched concurrently.
 
         Args:
-            url (str): The URL to scrape job cards from.
+            url (str): The search URL.
 
         Returns:
             list: A list of job card elements.
         """
         
-        if self.timeout_event.is_set():
-            return []
-            
-        print('===========>Getting cards for: ', url)
-        res = requests.get(url, headers=headers, timeout=3)
+        url = self.page_url(url, 1)
+        cards = await paginate(url, self.get_job_cards, self.page_url, self.card_num)
+        if self.published_after:
+            cards = [card for card in cards if card["publishedDate"] >= self.published_after]
+        return cards
+
+    @staticmethod
+    def window_start(time_period):
+        """
+        Returns the oldest publishedDate allowed by time_period, in the ISO format of the API, or None without time_period.
+
+        The API has no date filter, so the cards are compared to this string as soon as they are received
+        instead of parsing the date of each card.
+        """
+        if not time_period:
+            return None
+        start = datetime.now(timezone.utc) - timedelta(seconds=int(time_period))
+        return start.strftime('%Y-%m-%dT%H:%M:%S')
+
+    def page_url(self, url, page):
+        """
+        Returns the URL of a result page of the search URL, with offset and limit set for card_num.
+        """
+        limit = self.page_limit()
+        return set_query_param(set_query_param(url, 'limit', limit), 'offset', (page - 1) * limit)
+
+    def page_limit(self):
+        """
+        Returns the number of jobs asked for in each API request.
+        """
+        return max(1, min(self.card_num, PAGE_LIMIT))
         
-        cards = []
+    async def get_job_cards(self, url):
+        """
+        Fetches the job cards of one page of the API.
+
+        Args:
+            url (str): The URL to scrape job cards from.
+
+        Returns:
+            tuple: The list of job card elements and the total number of pages of the search.
+        """
         
-        if res.status_code==200:
-            time.sleep(.5)
-            cards = res.json()["data"]
-            print(f'Total jobs for {url}: ', len(cards))
-            if len(cards)>self.card_num:
-                return cards[0:self.card_num]
-            return cards
-        return cards
+        cards = []
+        total_pages = 1
+        if self.deadline.expired():
+            return cards, total_pages
+            
+        print('===========>Getting cards for: ', url)
+        try:
+            res = await client.get(url, headers=headers, timeout=3)
+
+            if res.status_code==200:
+                # decode the payload from bytes, without building the text of the response first
+                payload = orjson.loads(res.content)
+                cards = payload["data"]
+                total = payload.get("pagination", {}).get("total", len(cards))
+                total_pages = math.ceil(total / self.page_limit())
+                print(f'Total jobs for {url}: ', total)
+            else:
+                print(res.status_code)
+        except Exception as e:
+            print('Error while getting job cards: ', e)
+        return cards, total_pages
     
     
-    def get_job_info(self, card):
+    async def get_job_info(self, card):
         """
         Extracts job information from a job card element and returns a dictionary with the relevant data.
 
@@ -109,17 +167,13 @@ class Gupy:
             card (Dict[str, str]): A job card element.
 
         Returns:
-            Optional[dict]: A dictionary with job information, or None if the time_period condition is not met.
+            Optional[dict]: A dictionary with job information, or None if the job has no description.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return {}
 
         posted_date = card["publishedDate"].split('T')[0]
-        if self.time_period:
-            time_period = int(date_category(posted_date))
-            if time_period > int(self.time_period):
-                return
         
         company_name = card["careerPageName"]
         location = f"{card['city']}, {card['state']}, {card['country']}"
@@ -127,26 +181,25 @@ class Gupy:
         description = card["description"]
         job_url = card["jobUrl"]
 
-        rating = 0
-        if description:
-            try:
-                rating = rate_text(normalize_text(description), self.palavras)
-            except:
-                rating = '---'
-
-            job = {
-        "jobTitle": normalize_text(job_name),
-        "companyName": normalize_text(company_name),
-        "dayPosted": posted_date,
-        "jobURL": job_url,
-        'rating': rating,
-        'location': normalize_text(location)
-            }
-
-            print('JOB: ', json.dumps(job, indent=2))
-            return job
+        # parse_cards_url already kept the cards published within the time period, to the second
+        if not self.admits_card(job_name, company_name, location, job_url, rank_date=posted_date):
+            return
+
+        return self.make_job(description, normalize_text(job_name), normalize_text(company_name), posted_date, job_url, normalize_text(location))
+        
+    async def stream(self):
+        """
+        Fetches the job cards and yields each job posting as soon as its description is rated.
+        Cards are queued for their description as soon as their own page is parsed.
+
+        Yields:
+            dict: A dictionary with the job details.
+        """
         
-    def main(self):
+        async for job in scheduler.pipeline(self.site, self.urls, self.parse_cards_url, self.get_job_info, self.deadline, self.ranking):
+            yield job
+
+    async def main(self):
         """
         The main function that orchestrates the scraping and processing of job listings.
 
@@ -155,31 +208,7 @@ class Gupy:
         """
         
         try:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                cards = executor.map(self.get_job_cards, self.urls)
-
-            cards = list(cards)
-            print('//////////////////////')
-            print('Totla Gupy job Cards: ', len([crd for card in cards for crd in card]))
-            print('//////////////////////')
-
-            if len(cards) ==0:
-                return [[], 0]
-
-            results = []
-            
-            jobs_data_list = []
-            
-            for card in cards:
-                if self.timeout_event.is_set():
-                    break
-                if len(card)>0:
-                    with ThreadPoolExecutor(max_workers=len(card)) as executor:
-                        job_data = executor.map(self.get_job_info, card)
-
-                    jobs_data_list.extend(list(job_data))
-
-            results = [jb for jb in jobs_data_list if jb]
+            results = [job async for job in self.stream()]
     
             total_cards = len(results)
       
@@ -213,17 +242,13 @@ if __name__ == '__main__':
 	'espanhol'
 	]
 	
-    timeout_event = Event()
-    # Start the timeout thread before calling the extractJobs function
-    def stop_extraction():
-        time.sleep(20)
-        timeout_event.set()
-
-    extraction_thread = Thread(target=stop_extraction)
-    extraction_thread.start()
-    
-    gupy = Gupy(WEBSITE_URL, plavra, timeout_event)
-    jobs = gupy.main()
+    async def run_extraction():
+        # Stop the scraper once the time limit is reached
+        deadline = Deadline(20)
+        gupy = Gupy(WEBSITE_URL, plavra, deadline)
+        return await gupy.main()
+
+    jobs = asyncio.run(run_extraction())
 
     print('=+=+=+=+=+=+=+=+==+=+=+=++==+==++=+==+=+=+=+=+=+=+=+=+=+==+=+=+')
     print(json.dumps(jobs, indent=2))
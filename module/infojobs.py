@@ -6,19 +6,24 @@ Developer: Irfan Ahmad, devirfan.mlka@gmail.com
 Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
 """
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import Optional, List, Union
 
 from woocommerce import API
-from module.docsim import rate_text, normalize_text, date_category
+from module.docsim import normalize_text, date_category
+from module import client
+from module.scheduler import scheduler
+from module.pagination import paginate, set_query_param
+from module.parser import make_soup, select_text
+from module.cache import description_cache, description_key, single_flight
+from module.scraper import Scraper
 from itertools import repeat
 from math import sqrt
 
-from concurrent.futures import ThreadPoolExecutor
-from threading import Event, Thread
+from module.deadline import Deadline
 
 import os
-import requests
+import asyncio
 import json
 import re
 import time
@@ -27,32 +32,24 @@ import logging
 import unicodedata
 
 
-requests.adapters.DEFAULT_RETRIES = 3
 headers = {'user-agent':'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36'}
 
-def get_location(city):
-    location_url = f'https://www.infojobs.com.br/mf-publicarea/api/autocompleteapi/locations?query={city}'
-    res = requests.get(location_url, headers=headers)
-    res = res.json()['suggestions']
-    location_ids = []
-    for data in res:
-        location_ids.append(data['data']['id'])
-    
-    return location_ids
-
-class Infojobs:
+class Infojobs(Scraper):
     """
     A class that represents the InfoJobs scraper, designed to scrape job postings and analyze their descriptions based on given keywords.
     """
     
-    def __init__(self, urls:list, palavras, timeout_event: Event, time_period=None, card_num=10):
+    # site name used by the scheduler limits
+    site = 'infojobs'
+
+    def __init__(self, urls:list, palavras, deadline: Deadline, time_period=None, card_num=10):
         """
         Initializes the Infojobs object with the specified parameters.
 
         Args:
             urls (list): A list of URLs to scrape job postings from.
             palavras (list): A list of keywords to analyze job descriptions.
-            timeout_event (Event): A threading Event object used to stop the scraper after a specified period of time.
+            deadline (Deadline): The deadline of the scraper, no page is fetched after it has passed.
             time_period (Optional[str]): A time period filter for scraping job postings (default is None).
             card_num (int): The maximum number of job cards to scrape (default is 10).
         """
@@ -62,16 +59,14 @@ class Infojobs:
         self.time_period = time_period
         if time_period:
             self.time_period = time_period.split('=r')[-1]
-        self.timeout_event = timeout_event
+        self.deadline = deadline
         self.card_num = card_num
-        self.cards = []
-        self.total_pages = 1
-        self.page_index = 1
-        self.job_keyword = None
         
-    def parse_cards_url(self, url):
+    async def parse_cards_url(self, url):
         """
         Parses the specified URL to obtain a list of job cards.
+        The number of result pages is read from the first page, then the pages needed to reach card_num
+        cards are fetched concurrently.
 
         Args:
             url (str): The URL to parse.
@@ -80,68 +75,60 @@ class Infojobs:
             list: A list of job cards obtained from the specified URL.
         """
         
-        cards = []
-        cards = self.get_job_cards(cards, url)
-        if len(cards)>self.card_num:
-            return cards[0:self.card_num]
-        return cards
+        return await paginate(url, self.get_job_cards, self.page_url, self.card_num)
+
+    @staticmethod
+    def page_url(url, page):
+        """
+        Returns the URL of a result page of the search URL.
+        """
+        return set_query_param(url, 'page', page)
         
-    def get_job_cards(self, cards:list, url):
+    async def get_job_cards(self, url):
         """
-        Retrieves job cards from the specified URL and appends them to the cards list.
+        Retrieves the job cards of one result page.
 
         Args:
-            cards (list): The list of job cards to append new job cards to.
             url (str): The URL to retrieve job cards from.
 
         Returns:
-            list: The updated list of job cards.
+            tuple: The list of job cards of the page and the total number of result pages.
         """
         
-        if self.timeout_event.is_set():
-            return cards
+        cards = []
+        total_pages = 1
+        if self.deadline.expired():
+            return cards, total_pages
             
         print('===========>Getting cards for: ', url)
         try:
-            res = requests.get(url, headers=headers, timeout=3)
+            res = await client.get(url, headers=headers, timeout=3)
             if res.status_code == 200:
                 print('success status: ', res.status_code)
-                self.job_keyword = url.split('=')[1].split('&')[0]
-                time.sleep(.5)
                 html = res.content
                 
-                soup = BeautifulSoup(html, "html.parser")
+                soup = make_soup(html, SoupStrainer('div', id=['resumeVacancies', 'filterSideBar']))
 
-                if not '?page=' in url:
-                    total_pages_element = soup.find('div', {'id':"resumeVacancies"})
+                total_pages_element = soup.find('div', {'id':"resumeVacancies"})
+                if total_pages_element:
+                    total_pages_element = total_pages_element.find('div', class_='col-auto caption')
                     if total_pages_element:
-                        total_pages_element = total_pages_element.find('div', class_='col-auto caption')
-                        if total_pages_element:
-                            self.total_pages = int(total_pages_element.get_text().split()[-1])
+                        total_pages = int(total_pages_element.get_text().split()[-1])
             
                 cards_list = soup.find('div', {'id':"filterSideBar"})
                 # get cards
       
                 if cards_list:
-                    cards.extend(cards_list.find_all('div', class_='card'))
-                
-                if len(cards) >= self.card_num:
-                    return cards
-                                    
-                if self.total_pages > self.page_index:
-                    self.page_index += 1
-                    self.get_job_cards(cards, f'https://www.infojobs.com.br/vagas-de-emprego-{self.job_keyword}-em-porto-alegre,-rs.aspx?page={self.page_index}')
-                else:
-                    return cards
+                    cards = cards_list.find_all('div', class_='card')
             else:
                 print(res.status_code)
-                return cards
         except Exception as e:
             print('Error while getting job cards: ', e)
-            return cards
+
+        return cards, total_pages
     
     
-    def get_job_info(self, card):
+    async def get_job_info(self, card):
         """
         Extracts job information from a job card and returns it as a dictionary.
 
@@ -152,7 +139,7 @@ class Infojobs:
             dict: A dictionary containing the extracted job information.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return {}
 
         day_posted_element = card.find('div', class_='text-medium small')
@@ -177,32 +164,21 @@ class Infojobs:
         location_element = card.find('div', class_='small text-medium mr-24')
         location = location_element.get_text(strip=True) if location_element else "Not specified"
 
-        job_desc = self.extractDescription(job_url)
-
         company_name_element = card.find('a', class_='text-body text-decoration-none')
         company_name = company_name_element.get_text(strip=True) if company_name_element else "Not specified"
 
-        rating = 0
-        if job_desc is not None:
-            try:
-                rating = rate_text(normalize_text(job_desc), self.palavras)
-            except:
-                rating = '---'
+        if not self.admits_card(job_title, company_name, location, job_url, day_posted=day_posted):
+            return
 
-            job = {
-        "jobTitle": normalize_text(job_title),
-        "companyName": normalize_text(company_name),
-        "dayPosted": day_posted,
-        "jobURL": job_url,
-        'rating': rating,
-        'location': normalize_text(location)
-            }
+        # the description of a job found by a recent search is not downloaded again
+        stored = await self.stored_description(job_url)
+        job_desc = stored or await self.extractDescription(job_url)
 
-            print('JOB: ', json.dumps(job, indent=2))
-            return job
+        return self.make_job(job_desc, normalize_text(job_title), normalize_text(company_name), day_posted, job_url, normalize_text(location), stored=bool(stored))
 
 
-    def extractDescription(self, url):
+    @single_flight(lambda self, url: description_key('infojobs', url))
+    async def extractDescription(self, url):
         """
         Extracts the job description from a job posting URL.
 
@@ -213,23 +189,25 @@ class Infojobs:
             str: The extracted job description.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return None
+        
+        cache_key = description_key('infojobs', url)
+        description = await description_cache.aget(cache_key)
+        if description is not None:
+            return description
+        
         try:
-            res = requests.get(url, headers=headers, timeout=3)
+            res = await client.get(url, headers=headers, timeout=3)
             if res.status_code == 200:
                 description_page_info = {}
-                html = res.content
+                html = res.text
 
-                soup = BeautifulSoup(html, "html.parser")
-                descriptionDiv = soup.find("div", class_="js_vacancyDataPanels")
-      
                 # Get the text content of the element
-                if descriptionDiv is not None:
-                    description = descriptionDiv.text.strip()
-                else:
-                    description = None
+                description = select_text(html, "div.js_vacancyDataPanels")
                 
+                if description is not None:
+                    await description_cache.aset(cache_key, description)
                 return description
 
         except Exception as e:
@@ -237,7 +215,19 @@ class Infojobs:
             return None
             
         
-    def main(self):
+    async def stream(self):
+        """
+        Fetches the job cards and yields each job posting as soon as its description is rated.
+        Cards are queued for their description as soon as their own page is parsed.
+
+        Yields:
+            dict: A dictionary with the job details.
+        """
+        
+        async for job in scheduler.pipeline(self.site, self.urls, self.parse_cards_url, self.get_job_info, self.deadline, self.ranking):
+            yield job
+
+    async def main(self):
         """
         Main function that coordinates the scraping and processing of job postings from the InfoJobs website.
 
@@ -246,32 +236,7 @@ class Infojobs:
         """
         
         try:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                cards = executor.map(self.parse_cards_url, self.urls)
-
-            cards = list(cards)
-            print('Infojobs Cards: ', cards)
-            print('//////////////////////')
-            print('Total infojobs Cards: ', len([crd for card in cards for crd in card]))
-            print('//////////////////////')
-
-            if len(cards) ==0:
-                return [[], 0]
-                
-            results = []
-            
-            jobs_data_list = []
-            
-            for card in cards:
-                if self.timeout_event.is_set():
-                    break
-                if len(card)>0:
-                    with ThreadPoolExecutor(max_workers=len(card)) as executor:
-                        job_data = executor.map(self.get_job_info, card)
-
-                    jobs_data_list.extend(list(job_data))
-
-            results = [jb for jb in jobs_data_list if jb]
+            results = [job async for job in self.stream()]
     
             total_cards = len(results)
       
@@ -304,17 +269,13 @@ if __name__ == '__main__':
 	'espanhol'
 	]
 	
-    timeout_event = Event()
-    # Start the timeout thread before calling the extractJobs function
-    def stop_extraction():
-        time.sleep(300)
-        timeout_event.set()
-
-    extraction_thread = Thread(target=stop_extraction)
-    extraction_thread.start()
-    
-    infojobs = Infojobs(WEBSITE_URL, plavra, timeout_event)
-    jobs = infojobs.main()
+    async def run_extraction():
+        # Stop the scraper once the time limit is reached
+        deadline = Deadline(300)
+        infojobs = Infojobs(WEBSITE_URL, plavra, deadline)
+        return await infojobs.main()
+
+    jobs = asyncio.run(run_extraction())
 
     print('=+=+=+=+=+=+=+=+==+=+=+=++==+==++=+==+=+=+=+=+=+=+=+=+=+==+=+=+')
     print(json.dumps(jobs, indent=2))
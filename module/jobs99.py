@@ -5,7 +5,6 @@ This module provides the Jobs99 class to scrape job listings from 99jobs.com,
 extract job information from the job cards, and rate the job descriptions based on provided keywords.
 
 Attributes:
-    requests.adapters.DEFAULT_RETRIES (int): Default number of retries for requests.
     headers (dict): Default headers for requests.
 
 Classes:
@@ -16,19 +15,23 @@ Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
 """
 
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import Optional, List, Union
 
 from woocommerce import API
-from module.docsim import rate_text, normalize_text, date_category
+from module.docsim import normalize_text, date_category
+from module import client
+from module.scheduler import scheduler
+from module.parser import make_soup, select_text
+from module.cache import description_cache, description_key, single_flight
+from module.scraper import Scraper
 from itertools import repeat
 from math import sqrt
 
-from concurrent.futures import ThreadPoolExecutor
-from threading import Event, Thread
+from module.deadline import Deadline
 
 import os
-import requests
+import asyncio
 import json
 import re
 import time
@@ -37,17 +40,16 @@ import logging
 import unicodedata
 
 
-requests.adapters.DEFAULT_RETRIES = 3
 headers = {'user-agent':'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36'}
 
-class Jobs99:
+class Jobs99(Scraper):
     """
     A class that scrapes job listings from 99jobs.com.
     
     Attributes:
         urls (list): List of URLs to scrape job listings from.
         palavras (list): List of keywords for rating the job description.
-        timeout_event (Event): An event to stop the extraction process after a specified time.
+        deadline (Deadline): The deadline of the scraper, no page is fetched after it has passed.
         time_period (int): The time in seconds after which the extraction process will be stopped.
         card_num (int): Maximum number of job cards to be scraped.
         
@@ -61,15 +63,21 @@ class Jobs99:
         extractDescription(url: str) -> Optional[dict]:
             Extracts job description and location from a given job URL.
             
+        stream() -> AsyncIterator[Dict[str, Union[str, int]]]:
+            Yields each job posting as soon as its description is rated.
+
         main() -> List[Union[List[dict], int]]:
             Scrapes job listings from the provided URLs and returns the extracted job information.
     """
     
-    def __init__(self, urls:list, palavras, timeout_event: Event, time_period, card_num=10):
+    # site name used by the scheduler limits
+    site = '99jobs'
+
+    def __init__(self, urls:list, palavras, deadline: Deadline, time_period, card_num=10):
         self.urls = urls
         self.palavras = palavras
         self.time_period = time_period
-        self.timeout_event = timeout_event
+        self.deadline = deadline
         self.card_num = card_num
         
         self.total_jobs = 0
@@ -77,9 +85,7 @@ class Jobs99:
         
         self.page_index = 1
         
-        self.cards = []
-        
-    def get_job_cards(self, url):
+    async def get_job_cards(self, url):
         """
         Scrapes the job cards from the given URL.
         
@@ -87,32 +93,30 @@ class Jobs99:
             url (str): The URL to scrape job listings from.
             
         Returns:
-            list: A list of BeautifulSoup Tag objects representing the job cards.
+            list: A list of BeautifulSoup Tag objects representing the job cards of this URL only, the pipeline
+            queues every card it receives.
         """
         
-        if self.timeout_event.is_set():
-            return self.cards
+        cards = []
+        if self.deadline.expired():
+            return cards
             
         print('===========>Getting cards for: ', url)
         try:
-            res = requests.get(url, headers=headers, timeout=3)
+            res = await client.get(url, headers=headers, timeout=3)
             if res.status_code==200:
-                time.sleep(.5)
                 html = res.content
-                soup = BeautifulSoup(html, "html.parser")
+                soup = make_soup(html, SoupStrainer('a', class_='opportunity-card'))
             
-                self.cards.extend(soup.find_all('a', class_='opportunity-card'))
-                
-                if len(self.cards)>self.card_num:
-                    return self.cards[0:self.card_num]
+                cards = soup.find_all('a', class_='opportunity-card')
         
-            return self.cards
+            return cards[0:self.card_num]
             
         except:
-            return self.cards
+            return cards
     
     
-    def get_job_info(self, card):
+    async def get_job_info(self, card):
         """
         Extracts job information from a given job card.
         
@@ -123,50 +127,43 @@ class Jobs99:
             dict: A dictionary containing the extracted job information.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return {}
             
-        jobTitle = None
-        dayPosted = None
-        description = None
-        rating = None
-    
         jobURL = card['href']
         try:
             location = card.find('div', class_='opportunity-address').text.strip()
         except:
             location = 'location not given'
 
-        jobDesc = self.extractDescription(jobURL)
-
         try:
             companyName = card.find('div', class_='opportunity-company-infos').find("h2").text.strip()
         except:
             companyName = 'Not specified'
-        
-        if jobDesc is not None:
-            jobTitle = jobDesc['job_title']
-            dayPosted = jobDesc['days_ramained']
-    
-            try:
-                rating = rate_text(normalize_text(jobDesc['description']), self.palavras)
-            except:
-                rating = '---'
-        
-            job = {
-          "jobTitle": jobTitle,
-          "companyName": companyName,
-          "dayPosted": dayPosted,
-           "jobURL": jobURL,
-           'rating': rating,
-          'location': normalize_text(location)
-            }
-      
-            print('JOB: ', json.dumps(job, indent=2))
-            return job
+
+        if not self.admits_card(company=companyName, job_id=jobURL, claim=False):
+            return
+
+        # the page of a job found by a recent search is not downloaded again, the store keeps its title and date
+        stored = await self.stored_job(jobURL)
+        if stored:
+            job, description = stored
+            jobDesc = {'description': description, 'job_title': job['jobTitle'], 'days_ramained': job['dayPosted']}
+        else:
+            jobDesc = await self.extractDescription(jobURL)
+        if jobDesc is None:
+            return
+
+        # the title is only on the job page, so the fields are checked once the page is fetched
+        jobTitle = jobDesc['job_title']
+        if not self.admits_card(jobTitle, companyName, location):
+            return
+
+        return self.make_job(jobDesc['description'], jobTitle, companyName, jobDesc['days_ramained'], jobURL, normalize_text(location), stored=bool(stored))
 
 
-    def extractDescription(self, url):
+    @single_flight(lambda self, url: description_key('99jobs', url))
+    async def extractDescription(self, url):
         """
         Extracts job description and location from a given job URL.
         
@@ -177,15 +174,21 @@ class Jobs99:
             dict: A dictionary containing the job description and location, or None if an error occurs.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return None
+        
+        cache_key = description_key('99jobs', url)
+        description_page_info = await description_cache.aget(cache_key)
+        if description_page_info is not None:
+            return description_page_info
+        
         try:
-            res = requests.get(url, headers=headers, timeout=3)
+            res = await client.get(url, headers=headers, timeout=3)
             if res.status_code == 200:
                 description_page_info = {}
                 html = res.content
 
-                soup = BeautifulSoup(html, "html.parser")
+                soup = make_soup(html, SoupStrainer('div', class_=['opportunities-details', 'details']))
                 descriptionDiv = soup.find("div", class_="opportunities-details")
       
                 side_bar = soup.find('div', class_='details')
@@ -193,7 +196,7 @@ class Jobs99:
                 try:
                     job_title = side_bar.find('h2').text.strip()
                 except:
-                    job_title = soup.find('h1').text.strip()
+                    job_title = make_soup(html, SoupStrainer('h1')).find('h1').text.strip()
                     
                 print(url, ': ', job_title)
       
@@ -218,13 +221,26 @@ class Jobs99:
                 description_page_info['job_title'] = normalize_text(job_title)
                 description_page_info['days_ramained'] = days
                 
+                await description_cache.aset(cache_key, description_page_info)
                 return description_page_info
 
         except Exception as e:
             print('Error while getting job description: %s, %s', str(e), url)
             return None
         
-    def main(self):
+    async def stream(self):
+        """
+        Fetches the job cards and yields each job posting as soon as its description is rated.
+        Cards are queued for their description as soon as their own page is parsed.
+
+        Yields:
+            dict: A dictionary with the job details.
+        """
+        
+        async for job in scheduler.pipeline(self.site, self.urls, self.get_job_cards, self.get_job_info, self.deadline, self.ranking):
+            yield job
+
+    async def main(self):
         """
         Scrapes job listings from the provided URLs and returns the extracted job information.
         
@@ -233,30 +249,7 @@ class Jobs99:
         """
         
         try:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                cards = executor.map(self.get_job_cards, self.urls)
-
-            cards = list(cards)
-            print('//////////////////////')
-            print('Totla 99jobs Cards: ', len([crd for card in cards for crd in card]))
-            print('//////////////////////')
-
-            if len(cards) ==0:
-                return [[], 0]
-            results = []
-            
-            jobs_data_list = []
-            
-            for card in cards:
-                if self.timeout_event.is_set():
-                    break
-                if len(card)>0:
-                    with ThreadPoolExecutor(max_workers=len(card)) as executor:
-                        job_data = executor.map(self.get_job_info, card)
-
-                    jobs_data_list.extend(list(job_data))
-
-            results = [jb for jb in jobs_data_list if jb]
+            results = [job async for job in self.stream()]
     
             total_cards = len(results)
       
@@ -287,17 +280,13 @@ if __name__ == '__main__':
 	'espanhol'
 	]
 	
-    timeout_event = Event()
-    # Start the timeout thread before calling the extractJobs function
-    def stop_extraction():
-        time.sleep(20)
-        timeout_event.set()
+    async def run_extraction():
+        # Stop the scraper once the time limit is reached
+        deadline = Deadline(20)
+        jobs99 = Jobs99([WEBSITE_URL], plavra, deadline)
+        return await jobs99.main()
 
-    extraction_thread = Thread(target=stop_extraction)
-    extraction_thread.start()
-    
-    jobs99 = Jobs99([WEBSITE_URL], plavra, timeout_event)
-    jobs = jobs99.main()
+    jobs = asyncio.run(run_extraction())
 
     print('=+=+=+=+=+=+=+=+==+=+=+=++==+==++=+==+=+=+=+=+=+=+=+=+=+==+=+=+')
     print(json.dumps(jobs, indent=2))
@@ -6,19 +6,23 @@ Developer: Irfan Ahmad, devirfan.mlka@gmail.com
 Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
 """
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import Optional, List, Union
 
 from woocommerce import API
-from module.docsim import rate_text, normalize_text
+from module.docsim import normalize_text
+from module import client
+from module.scheduler import scheduler
+from module.parser import make_soup, select_text
+from module.cache import description_cache, description_key, single_flight
+from module.scraper import Scraper
 from itertools import repeat
 from math import sqrt
 
-from concurrent.futures import ThreadPoolExecutor
-from threading import Event, Thread
+from module.deadline import Deadline
 
 import os
-import requests
+import asyncio
 import json
 import re
 import time
@@ -27,10 +31,9 @@ import logging
 import unicodedata
 
 
-requests.adapters.DEFAULT_RETRIES = 3
 headers = {'user-agent':'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36'}
 
-class LinkedIn:
+class LinkedIn(Scraper):
     """
     A class used to represent a LinkedIn job scraper.
 
@@ -40,8 +43,8 @@ class LinkedIn:
         A list of LinkedIn job search URLs.
     palavras : list
         A list of keywords to rate the jobs.
-    timeout_event : Event
-        A threading Event object to control the timeout functionality.
+    deadline : Deadline
+        The deadline of the scraper, no page is fetched after it has passed.
     card_num : int, optional
         The maximum number of job cards to be returned, defaults to 10.
 
@@ -53,17 +56,22 @@ class LinkedIn:
         Extracts job information from a BeautifulSoup card object and a list of keywords.
     extractDescription(self, url)
         Extracts job description and location from a LinkedIn job posting URL.
+    stream(self)
+        Yields each job posting as soon as its description is rated.
     main(self)
         Controls the flow of the script, fetching job cards, extracting information, and returning the result.
     """
     
-    def __init__(self, urls:list, palavras, timeout_event: Event, card_num=10):
+    # site name used by the scheduler limits
+    site = 'linkedin'
+
+    def __init__(self, urls:list, palavras, deadline: Deadline, card_num=10):
         self.urls = urls
         self.palavras = palavras
-        self.timeout_event = timeout_event
+        self.deadline = deadline
         self.card_num = card_num
         
-    def get_job_cards(self, url):
+    async def get_job_cards(self, url):
         """
         Fetches the HTML content from a LinkedIn jobs search URL and returns a list of job cards as BeautifulSoup objects.
         
@@ -74,17 +82,17 @@ class LinkedIn:
             List[bs4.element.Tag]: A list of job cards as BeautifulSoup objects.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return []
         print('===========>Getting cards for: ', url)
         
-        res = requests.get(url)
+        res = await client.get(url)
         cards = []
         if res.status_code==200:
-            time.sleep(1)
             html = res.content    
 
-            soup = BeautifulSoup(html, "html.parser")
+            # the guest API returns bare <li> cards, the search page wraps them in the results list
+            soup = make_soup(html, SoupStrainer(['ul', 'li']))
 
             cards_ul = soup.find('ul', class_="jobs-search__results-list")
         
@@ -103,7 +111,7 @@ class LinkedIn:
         return cards
         
     
-    def get_job_info(self, card):
+    async def get_job_info(self, card):
         """
           Extracts job information from a BeautifulSoup card object and a list of keywords (plavras).
           
@@ -114,7 +122,7 @@ class LinkedIn:
               dict: A dictionary containing job title, company name, day posted, job URL, rating, location, and job description.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return {}
 
         jobTitle = card.find("h3", class_="base-search-card__title").text.strip()
@@ -128,38 +136,32 @@ class LinkedIn:
         except:
             location = 'location not given'
 
-        jobDesc = self.extractDescription(jobURL)
-        
         try:
-            companyName = card.find("h4", class_="base-search-card__subtitle").text.strip()
+            dayPosted = card.find("time").text.strip()
+            # ISO date of the posting, the text is relative ("2 weeks ago")
+            datePosted = card.find("time").get('datetime')
         except:
-            companyName = 'Not specified'
+            dayPosted = False
+            datePosted = None
 
         try:
-            dayPosted = card.find("time").text.strip()
+            companyName = card.find("h4", class_="base-search-card__subtitle").text.strip()
         except:
-            dayPosted = False
-          
-        if jobDesc:
-            try:
-                rating = rate_text(normalize_text(jobDesc), self.palavras)
-            except:
-                rating = '---'
-              
-            job = {
-                "jobTitle": jobTitle,
-                "companyName": companyName,
-                "dayPosted": dayPosted,
-                "jobURL": jobURL,
-                'rating': rating,
-                'location': location
-                }
-            
-            print('JOB: ', job)
-            return job
-
-
-    def extractDescription(self, url):
+            companyName = 'Not specified'
+
+        # the ISO date is checked, the text is relative
+        if not self.admits_card(jobTitle, companyName, location, jobURL, day_posted=datePosted):
+            return
+
+        # the description of a job found by a recent search is not downloaded again
+        stored = await self.stored_description(jobURL)
+        jobDesc = stored or await self.extractDescription(jobURL)
+
+        return self.make_job(jobDesc, jobTitle, companyName, dayPosted, jobURL, location, stored=bool(stored), datePosted=datePosted)
+
+
+    @single_flight(lambda self, url: description_key('linkedin', url))
+    async def extractDescription(self, url):
         """
           Extracts job description and location from a LinkedIn job posting URL.
           
@@ -169,23 +171,24 @@ class LinkedIn:
           Returns:
               dict: A dictionary containing the job description and location.
         """
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return None
         
-        description = None
+        cache_key = description_key('linkedin', url)
+        description = await description_cache.aget(cache_key)
+        if description is not None:
+            return description
+        
         try:
-          time.sleep(3)
-          res = requests.get(url, headers=headers, timeout=3)
+          res = await client.get(url, headers=headers, timeout=3)
           if res.status_code == 200:
-            html = res.content
+            html = res.text
 
-            soup = BeautifulSoup(html, "html.parser")
-            descriptionDiv = soup.find("div", class_="show-more-less-html__markup")
-          
-            time.sleep(0.5)
             # Get the text content of the element
-            if descriptionDiv is not None:
-              description = normalize_text(descriptionDiv.text.strip())
+            descriptionText = select_text(html, "div.show-more-less-html__markup")
+            if descriptionText is not None:
+              description = normalize_text(descriptionText)
+              await description_cache.aset(cache_key, description)
             else:
               description = None
 
@@ -194,7 +197,19 @@ class LinkedIn:
 
         return description
         
-    def main(self):
+    async def stream(self):
+        """
+        Fetches the job cards and yields each job posting as soon as its description is rated.
+        Cards are queued for their description as soon as their own page is parsed.
+
+        Yields:
+            dict: A dictionary with the job details.
+        """
+        
+        async for job in scheduler.pipeline(self.site, self.urls, self.get_job_cards, self.get_job_info, self.deadline, self.ranking):
+            yield job
+
+    async def main(self):
         """
         Controls the flow of the script, fetching job cards, extracting information, and returning the result.
 
@@ -203,41 +218,12 @@ class LinkedIn:
         """
         
         try:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                cards = executor.map(self.get_job_cards, self.urls)
-
-            cards = list(cards)
-
-            if len(cards) ==0:
-                return [[], 0]
-            results = []
-            
-            job_data_list = []
-
-            for card in cards:
-                if self.timeout_event.is_set():
-                    break
-                if len(card)>0:
-                    time.sleep(2)
-                    root = sqrt(len(card))
-                    if root >=1:
-                        if root > 10:
-                            workers = round(sqrt(len(card)))
-                        else:
-                            workers = len(card)
-                    else:
-                        workers = 1
-                    with ThreadPoolExecutor(max_workers=workers) as executor:
-                        job_data = executor.map(self.get_job_info, card)
-
-                    job_data_list.extend(list(job_data))
-
-            results = [jb for jb in job_data_list if jb]
-              
+            results = [job async for job in self.stream()]
+    
             total_cards = len(results)
-                
+      
             return [results, total_cards]
-        
+  
         except Exception as e:
             print(e)
             return [[], 0]
@@ -269,17 +255,13 @@ if __name__ == '__main__':
         
     ]
 
-    timeout_event = Event()
-    # Start the timeout thread before calling the extractJobs function
-    def stop_extraction():
-        time.sleep(90)
-        timeout_event.set()
-        
-    extraction_thread = Thread(target=stop_extraction)
-    extraction_thread.start()
-    
-    linked = LinkedIn(url_list, plavra, timeout_event)
-    jobs = linked.main()
+    async def run_extraction():
+        # Stop the scraper once the time limit is reached
+        deadline = Deadline(90)
+        linked = LinkedIn(url_list, plavra, deadline)
+        return await linked.main()
+
+    jobs = asyncio.run(run_extraction())
 
     elapsed_time = time.time() - start_time
 
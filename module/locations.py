@@ -0,0 +1,161 @@
+"""
+This module resolves city names into the location ids used by the Infojobs search URLs.
+
+The city to location id mapping almost never changes, so the ids returned by the Infojobs autocomplete API are kept
+in location_cache (shared by the workers through the SQLite file when JOBS_CACHE_PATH is set) and refreshed once
+their TTL expires.
+
+The ids of BR_CITIES, the main Brazilian cities, are bundled with the module in LOCATIONS_FILE. Every worker loads
+them into location_cache at startup without any request, so most searches resolve their city without a network round
+trip; a city is only looked up again once its TTL expires. The file is generated by running this module, which
+resolves BR_CITIES with the autocomplete API. Warming the cache from the network at startup is opt-in.
+
+The main functions are:
+1. get_location(city): Return the Infojobs location ids of a city, from the cache when possible.
+2. seed_locations(path): Load the bundled ids into the cache, without any request.
+3. warm_locations(cities): Resolve the cities missing from the cache with the autocomplete API.
+
+Settings (environment variables):
+    JOBS_LOCATION_CACHE_TTL: Number of seconds the ids of a city are kept (default 30 days).
+    JOBS_LOCATION_CACHE_SIZE: Maximum number of cities kept (default 2000).
+    JOBS_LOCATIONS_FILE: Path of the JSON file of bundled location ids (default infojobs_locations.json next to
+        this module).
+    JOBS_WARM_LOCATIONS: Set to 1 to resolve the cities of BR_CITIES missing from the bundled ids at startup, with one
+        request per city and worker (default 0).
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+from module import client
+from module.cache import create_cache, single_flight
+
+import os
+import json
+import asyncio
+import urllib.parse
+import logging
+import unicodedata
+
+
+LOCATION_CACHE_TTL = int(os.environ.get('JOBS_LOCATION_CACHE_TTL', 30 * 24 * 3600))
+LOCATION_CACHE_SIZE = int(os.environ.get('JOBS_LOCATION_CACHE_SIZE', 2000))
+# cities unknown to Infojobs are looked up again sooner
+MISSING_LOCATION_TTL = 3600
+WARM_LOCATIONS = os.environ.get('JOBS_WARM_LOCATIONS', '0') == '1'
+LOCATIONS_FILE = os.environ.get('JOBS_LOCATIONS_FILE', os.path.join(os.path.dirname(__file__), 'infojobs_locations.json'))
+
+LOCATION_URL = 'https://www.infojobs.com.br/mf-publicarea/api/autocompleteapi/locations?query='
+
+# state capitals and the largest cities of Brazil
+BR_CITIES = (
+    'Sao Paulo', 'Rio de Janeiro', 'Brasilia', 'Salvador', 'Fortaleza', 'Belo Horizonte', 'Manaus', 'Curitiba',
+    'Recife', 'Goiania', 'Belem', 'Porto Alegre', 'Sao Luis', 'Maceio', 'Campo Grande', 'Natal', 'Teresina',
+    'Joao Pessoa', 'Aracaju', 'Cuiaba', 'Florianopolis', 'Porto Velho', 'Macapa', 'Rio Branco', 'Vitoria',
+    'Boa Vista', 'Palmas', 'Guarulhos', 'Campinas', 'Sao Goncalo', 'Duque de Caxias', 'Nova Iguacu',
+    'Sao Bernardo do Campo', 'Santo Andre', 'Osasco', 'Jaboatao dos Guararapes', 'Sao Jose dos Campos',
+    'Ribeirao Preto', 'Uberlandia', 'Sorocaba', 'Contagem', 'Feira de Santana', 'Joinville', 'Juiz de Fora',
+    'Londrina', 'Aparecida de Goiania', 'Niteroi', 'Serra', 'Caxias do Sul', 'Campos dos Goytacazes', 'Vila Velha',
+    'Mogi das Cruzes', 'Santos', 'Diadema', 'Jundiai', 'Maringa', 'Piracicaba', 'Carapicuiba', 'Olinda',
+    'Montes Claros', 'Betim', 'Bauru', 'Canoas', 'Blumenau', 'Pelotas', 'Ponta Grossa', 'Cascavel',
+)
+
+location_cache = create_cache('infojobs_locations', LOCATION_CACHE_SIZE, LOCATION_CACHE_TTL)
+
+
+def location_key(city: str) -> str:
+    """
+    Build the location_cache key of a city, ignoring case, accents and spacing.
+    """
+    city = unicodedata.normalize('NFKD', city)
+    city = ''.join(char for char in city if not unicodedata.combining(char))
+    return ' '.join(city.lower().split())
+
+
+async def get_location(city: str) -> list:
+    """
+    Return the Infojobs location ids of a city.
+
+    Parameters:
+    city (str): The city name.
+
+    Returns:
+    List[int]: The location ids suggested by Infojobs for the city, empty if it is unknown.
+    """
+    location_ids = await location_cache.aget(location_key(city))
+    if location_ids is not None:
+        return location_ids
+
+    return await _fetch_location(location_key(city))
+
+
+@single_flight(lambda city: city)
+async def _fetch_location(city: str) -> list:
+    res = await client.get(LOCATION_URL + urllib.parse.quote(city))
+    res.raise_for_status()
+
+    location_ids = [data['data']['id'] for data in res.json()['suggestions']]
+    await location_cache.aset(city, location_ids, LOCATION_CACHE_TTL if location_ids else MISSING_LOCATION_TTL)
+    return location_ids
+
+
+async def warm_locations(cities=BR_CITIES):
+    """
+    Resolve the cities missing from location_cache, so that searches for them need no lookup.
+
+    Parameters:
+    cities (Iterable[str]): The city names, BR_CITIES by default.
+    """
+    missing = [location_key(city) for city in cities if await location_cache.aget(location_key(city)) is None]
+    results = await asyncio.gather(*[_fetch_location(city) for city in missing], return_exceptions=True)
+
+    failed = sum(isinstance(result, Exception) for result in results)
+    if failed:
+        logging.error('Could not resolve the infojobs location of %d cities', failed)
+    logging.info('Infojobs locations warmed: %d cities resolved', len(missing) - failed)
+
+
+async def seed_locations(path: str = LOCATIONS_FILE):
+    """
+    Load the bundled location ids into location_cache, without any request. The ids expire after
+    JOBS_LOCATION_CACHE_TTL like the ones looked up, and are then refreshed by get_location.
+
+    Parameters:
+    path (str): The JSON file, mapping city names to their list of location ids.
+    """
+    try:
+        with open(path, encoding='utf-8') as file:
+            locations = json.load(file)
+    except FileNotFoundError:
+        logging.info('No bundled infojobs locations at %s', path)
+        return
+    except (OSError, ValueError) as e:
+        logging.error('Error while reading the bundled infojobs locations %s: %s', path, str(e))
+        return
+
+    for city, location_ids in locations.items():
+        if location_ids and await location_cache.aget(location_key(city)) is None:
+            await location_cache.aset(location_key(city), location_ids)
+    logging.info('Infojobs locations loaded: %d cities', len(locations))
+
+
+async def build_locations_file(path: str = LOCATIONS_FILE, cities=BR_CITIES):
+    """
+    Resolve cities with the autocomplete API and write their ids to the bundled file read by seed_locations.
+    """
+    results = await asyncio.gather(*[_fetch_location(location_key(city)) for city in cities], return_exceptions=True)
+    locations = {location_key(city): ids for city, ids in zip(cities, results) if isinstance(ids, list) and ids}
+
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(locations, file, indent=2, sort_keys=True)
+    print(f'{len(locations)} of {len(cities)} cities written to {path}')
+
+
+if __name__ == '__main__':
+    async def run_build():
+        try:
+            await build_locations_file()
+        finally:
+            await client.close_client()
+
+    asyncio.run(run_build())
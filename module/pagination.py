@@ -0,0 +1,84 @@
+"""
+This module fetches the result pages of a paginated job search.
+
+The first page is fetched alone to read the number of result pages and the number of cards per page. The pages still
+needed to reach the requested number of cards are then fetched concurrently, so a deep result set costs one round
+trip after the first page instead of one round trip per page. All the state of a search lives in the call, so
+several searches of the same site can be paginated at the same time. A page that fails is skipped, the cards of the
+other pages are kept.
+
+The main functions are:
+1. paginate(url, get_page, page_url, card_num, max_pages): Return up to card_num cards from the pages of a search.
+2. set_query_param(url, name, value): Return url with a query parameter set, used to build the page URLs.
+
+Settings (environment variables):
+    JOBS_MAX_PAGES: Maximum number of result pages fetched for one search URL (default 10).
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+import os
+import math
+import asyncio
+import logging
+
+from module.deadline import DeadlineExceeded
+
+
+MAX_PAGES = int(os.environ.get('JOBS_MAX_PAGES', 10))
+
+
+def set_query_param(url: str, name: str, value) -> str:
+    """
+    Return url with the query parameter name set to value, replacing it if it is already there.
+
+    Parameters:
+    url (str): The URL.
+    name (str): The name of the query parameter.
+    value: The value of the query parameter.
+
+    Returns:
+    str: The new URL.
+    """
+    parts = urlsplit(url)
+    query = [(key, val) for key, val in parse_qsl(parts.query, keep_blank_values=True) if key != name]
+    query.append((name, str(value)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+async def paginate(url: str, get_page, page_url, card_num: int, max_pages: int = MAX_PAGES) -> list:
+    """
+    Return up to card_num cards from the result pages of a search.
+
+    Parameters:
+    url (str): The URL of the first result page.
+    get_page (callable): Coroutine function receiving a page URL and returning (cards, total_pages).
+        total_pages is only read from the first page.
+    page_url (callable): Receives url and a page number starting at 2 and returns the URL of that page.
+    card_num (int): The number of cards wanted.
+    max_pages (int): Maximum number of pages fetched.
+
+    Returns:
+    list: The cards, in page order.
+    """
+    cards, total_pages = await get_page(url)
+    if len(cards) >= card_num or not cards:
+        return cards[:card_num]
+
+    # assume the next pages hold as many cards as the first one
+    needed = math.ceil((card_num - len(cards)) / len(cards))
+    last_page = min(total_pages, 1 + needed, max_pages)
+
+    pages = await asyncio.gather(*[get_page(page_url(url, page)) for page in range(2, last_page + 1)], return_exceptions=True)
+    for page in pages:
+        if isinstance(page, BaseException):
+            # the deadline of the site is already marked as exceeded
+            if not isinstance(page, DeadlineExceeded):
+                logging.error('Error while getting a result page of %s: %s', url, str(page))
+            continue
+        cards.extend(page[0])
+
+    return cards[:card_num]
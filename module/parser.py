@@ -0,0 +1,155 @@
+"""
+This module selects the HTML parsing engine used by the scrapers.
+
+Job cards are handled as BeautifulSoup trees, built with lxml when it is installed because it is several times
+faster than the pure Python "html.parser". Job descriptions only need the text of one element, so they are extracted
+with the selectolax lexbor engine when it is installed, without building a BeautifulSoup tree at all.
+"html.parser" is always available as the fallback.
+
+Pages are only partially parsed: card pages pass a SoupStrainer so that only the card containers become a tree,
+and descriptions are first cut out of the page by a tokenizer that stops at the end of the target element.
+
+The main functions are:
+1. make_soup(html, parse_only): Parse a page, or the parts kept by a SoupStrainer, with the configured tree builder.
+2. slice_element(html, selector): Cut the markup of the first element matching a "tag.class" or "tag#id" selector.
+3. select_text(html, selector): Return the stripped text of the first element matching a CSS selector.
+
+Settings (environment variables):
+    JOBS_HTML_PARSER: "selectolax", "lxml" or "html.parser". Defaults to the fastest installed engine.
+        With "lxml" or "html.parser" every page, descriptions included, is parsed with BeautifulSoup.
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+from bs4 import BeautifulSoup, SoupStrainer
+from functools import lru_cache
+
+import os
+import re
+import logging
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+def _default_parser():
+    if LexborHTMLParser is not None:
+        return 'selectolax'
+    if lxml is not None:
+        return 'lxml'
+    return 'html.parser'
+
+
+HTML_PARSER = os.environ.get('JOBS_HTML_PARSER', _default_parser())
+
+if HTML_PARSER == 'selectolax' and LexborHTMLParser is None or HTML_PARSER == 'lxml' and lxml is None:
+    logging.warning('HTML parser %s is not installed, falling back to %s', HTML_PARSER, _default_parser())
+    HTML_PARSER = _default_parser()
+
+# BeautifulSoup tree builder used for job cards
+TREE_BUILDER = 'lxml' if lxml is not None and HTML_PARSER != 'html.parser' else 'html.parser'
+
+
+def make_soup(html, parse_only: SoupStrainer = None) -> BeautifulSoup:
+    """
+    Parse a page into a BeautifulSoup tree with the configured tree builder.
+
+    Parameters:
+    html (Union[str, bytes]): The page content.
+    parse_only (Optional[SoupStrainer]): Only the elements matched by the strainer are added to the tree.
+
+    Returns:
+    BeautifulSoup: The parsed page.
+    """
+    return BeautifulSoup(html, TREE_BUILDER, parse_only=parse_only)
+
+
+@lru_cache(maxsize=64)
+def _element_patterns(selector: str):
+    """
+    Compile the patterns finding the opening tag of a "tag.class" or "tag#id" selector and the tags of the same name.
+    """
+    match = re.match(r'^(\w+)([.#])([\w-]+)$', selector)
+    if match is None:
+        return None
+
+    tag, kind, name = match.groups()
+    attribute = 'class' if kind == '.' else 'id'
+    opening = re.compile(
+        rf'<{tag}\b[^>]*\b{attribute}\s*=\s*["\']?[^"\'>]*(?<![\w-]){re.escape(name)}(?![\w-])', re.I
+    )
+    tags = re.compile(rf'<(/?){tag}\b[^>]*>', re.I)
+    return opening, tags
+
+
+def slice_element(html: str, selector: str):
+    """
+    Cut the markup of the first element matching a simple "tag.class" or "tag#id" selector out of a page.
+
+    The page is scanned for the opening tag, then tags of the same name are counted until the element
+    is closed, so nothing after the element is read and nothing outside of it has to be parsed.
+
+    Parameters:
+    html (str): The page content.
+    selector (str): A "tag.class" or "tag#id" selector.
+
+    Returns:
+    Optional[str]: The markup of the element, or None if the selector is not simple or no opening tag matches.
+    """
+    patterns = _element_patterns(selector)
+    if patterns is None:
+        return None
+
+    opening, tags = patterns
+    start = opening.search(html)
+    if start is None:
+        return None
+
+    depth = 0
+    for tag in tags.finditer(html, start.start()):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return html[start.start():tag.end()]
+
+    return html[start.start():]
+
+
+def select_text(html, selector: str):
+    """
+    Return the stripped text of the first element matching a CSS selector.
+
+    Parameters:
+    html (Union[str, bytes]): The page content.
+    selector (str): A CSS selector, for example "div.jobview__info".
+
+    Returns:
+    Optional[str]: The text of the element, or None if no element matches.
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+
+    # parse the element alone when it can be cut out of the page, the whole page otherwise
+    fragment = slice_element(html, selector)
+    if fragment is not None:
+        text = _select_text(fragment, selector)
+        if text is not None:
+            return text
+
+    return _select_text(html, selector)
+
+
+def _select_text(html: str, selector: str):
+    if HTML_PARSER == 'selectolax':
+        node = LexborHTMLParser(html).css_first(selector)
+        return node.text().strip() if node is not None else None
+
+    element = make_soup(html).select_one(selector)
+    return element.text.strip() if element is not None else None
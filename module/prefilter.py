@@ -0,0 +1,100 @@
+"""
+This module decides from the fields of a job card whether the job can be returned, before its description is fetched.
+
+Most of the time of a search goes into downloading job descriptions. A card already shows the title, the company,
+often the posting date and the URL of the job, so the jobs that the search rules out anyway are dropped before any
+description request: jobs older than the time period, jobs of excluded companies, titles without the required words
+or with excluded ones, and the jobs the client already has.
+
+The main class and functions are:
+1. CardFilter(max_age, exclude_companies, title_must, title_must_not, seen_ids): The rules of a search, with admits().
+2. max_age(time_period): The maximum age in seconds of the jobs of a LinkedIn time parameter.
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+from module.docsim import date_category
+from module.dedupe import fold
+
+
+def max_age(time_period):
+    """
+    Return the maximum age in seconds of the jobs of a LinkedIn time parameter such as "&f_TPR=r604800",
+    or None when any age is accepted.
+    """
+    if not time_period:
+        return None
+    return int(time_period.split('=r')[-1])
+
+
+def phrase(text: str) -> str:
+    # the words of a field without accents, padded so that a phrase only matches whole words
+    return ' ' + ' '.join(fold(text)) + ' '
+
+
+class CardFilter:
+    """
+    The rules a job card has to pass before its description is fetched.
+
+    Every rule is only checked when the scraper knows the field from the card, so a card is never dropped for a
+    field it does not show.
+
+    Attributes:
+        max_age (Optional[int]): Maximum age of the jobs in seconds, as in the date categories of docsim.date_category.
+        exclude_companies (list): Companies whose jobs are dropped, a company matches if it contains one of the names.
+        title_must (list): Words or phrases that all have to be in the title.
+        title_must_not (list): Words or phrases of which none can be in the title.
+        seen_ids (set): The jobURL of the jobs the client already has.
+        skipped (int): Number of cards dropped.
+    """
+
+    def __init__(self, max_age=None, exclude_companies=(), title_must=(), title_must_not=(), seen_ids=()):
+        self.max_age = max_age
+        self.exclude_companies = [phrase(company) for company in exclude_companies if fold(company)]
+        self.title_must = [phrase(word) for word in title_must if fold(word)]
+        self.title_must_not = [phrase(word) for word in title_must_not if fold(word)]
+        self.seen_ids = set(seen_ids)
+        self.skipped = 0
+
+    def admits(self, title=None, company=None, day_posted=None, job_id=None) -> bool:
+        """
+        Return False if a card breaks one of the rules, so its description is not needed.
+
+        Parameters:
+        title (Optional[str]): The job title.
+        company (Optional[str]): The company name.
+        day_posted (Optional[str]): The posting date, in a format known to docsim.date_category.
+        job_id (Optional[str]): The jobURL of the job.
+
+        Returns:
+        bool: True if the job may be returned.
+        """
+        if self.passes(title, company, day_posted, job_id):
+            return True
+        self.skipped += 1
+        return False
+
+    def passes(self, title, company, day_posted, job_id) -> bool:
+        if job_id is not None and job_id in self.seen_ids:
+            return False
+
+        if company is not None and self.exclude_companies:
+            company = phrase(company)
+            if any(excluded in company for excluded in self.exclude_companies):
+                return False
+
+        if title is not None and (self.title_must or self.title_must_not):
+            title = phrase(title)
+            if not all(word in title for word in self.title_must):
+                return False
+            if any(word in title for word in self.title_must_not):
+                return False
+
+        if day_posted and self.max_age is not None:
+            # dates in an unknown format are kept
+            category = date_category(day_posted)
+            if category.isdigit() and int(category) > self.max_age:
+                return False
+
+        return True
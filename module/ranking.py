@@ -0,0 +1,149 @@
+"""
+This module ranks the jobs of a search on the server, by rating or by recency, and keeps only the best top_k.
+
+The best jobs are kept in a bounded min-heap while the results come in, so selecting the top_k of n jobs costs
+O(n log top_k) and the worst kept job is always at hand. When ranking by recency the posted date of a job is known
+from its card, so once the heap is full the cards that cannot beat the worst kept job are skipped before their
+description is fetched. The rating of a job needs its description, so the rating ranking cannot skip cards.
+
+The main class and functions are:
+1. TopK(k, rank_by): The best k jobs seen so far, with admits() to skip cards that cannot enter them.
+2. rank_jobs(jobs, rank_by, top_k): Return the jobs ordered best first, only the top_k best when it is given.
+3. rank_key(job, rank_by): The sort key of a job, higher is better.
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+from datetime import date
+from itertools import count
+
+from module.docsim import parse_date
+
+import heapq
+
+
+RANK_BY = ('rating', 'recency')
+
+
+def rating_key(job: dict) -> float:
+    """
+    Return the rating of a job, 0 when it was not rated and -1 when its rating failed.
+    """
+    rating = job.get('rating')
+    if isinstance(rating, dict):
+        return rating.get('rating', 0)
+    if isinstance(rating, (int, float)):
+        return rating
+    return -1
+
+
+def recency_key(day_posted) -> int:
+    """
+    Return the ordinal of the posted date of a job, 0 when the date is missing or in an unknown format.
+    """
+    if not isinstance(day_posted, str):
+        return 0
+    posted = parse_date(day_posted.strip().lower(), date.today())
+    return posted.toordinal() if posted else 0
+
+
+def posted_key(job: dict) -> int:
+    """
+    Return the recency key of a job, from its ISO datePosted when the site gives one besides the dayPosted text.
+    """
+    return recency_key(job.get('datePosted') or job.get('dayPosted'))
+
+
+def rank_key(job: dict, rank_by: str = 'rating'):
+    """
+    Return the sort key of a job, higher is better.
+
+    Parameters:
+    job (dict): The job dictionary.
+    rank_by (str): 'rating', or 'recency' for the newest jobs first. Ties are broken by the other key.
+
+    Returns:
+    tuple: The sort key.
+    """
+    if rank_by == 'recency':
+        return posted_key(job), rating_key(job)
+    return rating_key(job), posted_key(job)
+
+
+def rank_jobs(jobs: list, rank_by: str = 'rating', top_k: int = None) -> list:
+    """
+    Return the jobs ordered best first, only the top_k best when top_k is given.
+
+    The order of jobs with the same key is kept.
+    """
+    if top_k is None:
+        return sorted(jobs, key=lambda job: rank_key(job, rank_by), reverse=True)
+    return heapq.nlargest(top_k, jobs, key=lambda job: rank_key(job, rank_by))
+
+
+class TopK:
+    """
+    The best k jobs seen so far, kept in a min-heap so that the worst of them is always at hand.
+
+    Attributes:
+        k (int): The number of jobs kept.
+        rank_by (str): 'rating' or 'recency', see rank_key.
+        heap (list): (key, sequence, job) entries, the worst kept job first.
+        kept (set): The ids of the kept jobs, for `job in top_k`.
+    """
+
+    def __init__(self, k: int, rank_by: str = 'rating'):
+        if rank_by not in RANK_BY:
+            raise ValueError(f'Unknown ranking: {rank_by}')
+
+        self.k = k
+        self.rank_by = rank_by
+        self.heap = []
+        self.kept = set()
+        self.sequence = count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, job):
+        return id(job) in self.kept
+
+    def full(self) -> bool:
+        return len(self.heap) >= self.k
+
+    def push(self, job: dict) -> bool:
+        """
+        Add a job, dropping the worst kept job when there are more than k.
+
+        Returns:
+        bool: True if the job is among the best k jobs seen so far.
+        """
+        # the sequence keeps the first of equal jobs and avoids comparing the job dictionaries
+        entry = (rank_key(job, self.rank_by), -next(self.sequence), job)
+        if not self.full():
+            heapq.heappush(self.heap, entry)
+        elif entry[:2] <= self.heap[0][:2]:
+            return False
+        else:
+            self.kept.discard(id(heapq.heapreplace(self.heap, entry)[2]))
+        self.kept.add(id(job))
+        return True
+
+    def admits(self, day_posted) -> bool:
+        """
+        Return False if a card posted on day_posted cannot enter the best k jobs, so its description is not needed.
+        day_posted has to be in a format known to recency_key, such as the ISO datePosted of LinkedIn.
+
+        Only the recency ranking knows the key of a card before its description is rated.
+        """
+        if self.rank_by != 'recency' or not self.full():
+            return True
+        # a card posted on the same day as the worst kept job may still beat it on rating
+        return recency_key(day_posted) >= self.heap[0][0][0]
+
+    def jobs(self) -> list:
+        """
+        Return the kept jobs, best first.
+        """
+        return [job for _, _, job in sorted(self.heap, reverse=True)]
@@ -0,0 +1,127 @@
+"""
+This module paces the requests sent to each job site with token buckets.
+
+Every host gets a bucket that refills at a steady rate and holds up to a burst of tokens. A request takes one token
+and only waits when the bucket is empty, so requests are spread at the host's politeness limit instead of sleeping
+a fixed time on every fetch.
+
+The main classes are:
+1. TokenBucket(rate, burst): Allows `rate` requests per second on average, with bursts of up to `burst` requests.
+2. RateLimiter(limits, default): Keeps one TokenBucket per host, configured by host name suffix.
+
+The module also creates rate_limiter, used by module.client for every request.
+
+Settings (environment variables):
+    JOBS_RATE_LIMITS: Comma separated `host=rate:burst` entries overriding HOST_LIMITS,
+        for example "linkedin.com=1:3,gupy.io=10:20".
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+
+# requests per second and burst size by host name suffix
+HOST_LIMITS = {
+    'linkedin.com': (2, 4),
+    'infojobs.com.br': (5, 10),
+    'trabalhabrasil.com.br': (5, 10),
+    '99jobs.com': (5, 10),
+    'gupy.io': (10, 20),
+    'balcaodeempregos.com.br': (5, 10),
+}
+DEFAULT_LIMIT = (10, 20)
+
+
+class TokenBucket:
+    """
+    A token bucket allowing `rate` requests per second on average, with bursts of up to `burst` requests.
+
+    Attributes:
+        rate (float): Number of tokens added per second.
+        burst (float): Maximum number of tokens in the bucket.
+        tokens (float): Number of tokens available, negative when requests are already waiting.
+        updated (float): Time of the last refill.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """
+        Take a token, waiting until one is available.
+
+        The token is reserved before waiting, so concurrent callers are served in order
+        without waking each other up.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class RateLimiter:
+    """
+    Keeps one TokenBucket per host.
+
+    Attributes:
+        limits (dict): (rate, burst) by host name suffix.
+        default (tuple): (rate, burst) for hosts that match no suffix.
+        buckets (dict): The TokenBucket of each host seen so far.
+    """
+
+    def __init__(self, limits: dict = None, default: tuple = DEFAULT_LIMIT):
+        self.limits = limits if limits is not None else HOST_LIMITS
+        self.default = default
+        self.buckets = {}
+
+    def bucket(self, host: str) -> TokenBucket:
+        """
+        Return the TokenBucket of a host, creating it from the longest matching suffix.
+        """
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            suffixes = [suffix for suffix in self.limits if host == suffix or host.endswith('.' + suffix)]
+            rate, burst = self.limits[max(suffixes, key=len)] if suffixes else self.default
+            bucket = self.buckets[host] = TokenBucket(rate, burst)
+        return bucket
+
+    async def wait(self, host: str):
+        """
+        Wait until a request to host is allowed.
+        """
+        await self.bucket(host).acquire()
+
+
+def read_limits(setting: str) -> dict:
+    """
+    Parse the JOBS_RATE_LIMITS setting.
+
+    Parameters:
+    setting (str): Comma separated `host=rate:burst` entries.
+
+    Returns:
+    dict: (rate, burst) by host name suffix.
+    """
+    limits = {}
+    for entry in filter(None, (part.strip() for part in setting.split(','))):
+        try:
+            host, values = entry.split('=')
+            rate, burst = values.split(':')
+            limits[host.strip()] = (float(rate), float(burst))
+        except ValueError:
+            logging.error('Invalid rate limit setting: %s', entry)
+    return limits
+
+
+rate_limiter = RateLimiter({**HOST_LIMITS, **read_limits(os.environ.get('JOBS_RATE_LIMITS', ''))})
@@ -0,0 +1,154 @@
+"""
+This module bounds the number of scraping tasks running at the same time in the process.
+
+Every card page and job description is run through the process-wide scheduler, which holds one global limit
+shared by all requests and sites, plus a smaller limit per site. The number of tasks in flight therefore stays
+the same whatever the number of titles, sites and cards in the running searches; extra tasks wait for a free slot.
+
+Scheduler.pipeline connects the card pages of a site to its job descriptions: every card is queued for its
+description fetch as soon as the page it comes from is parsed, so one slow search page does not hold back the
+cards of the others. Every task runs with the deadline of the site and is cancelled when it passes.
+
+The main class is:
+1. Scheduler(limit, site_limits, default_site_limit): Run coroutine functions under a global and a per-site limit.
+
+The module also creates scheduler, used by every scraper.
+
+Settings (environment variables):
+    JOBS_MAX_IN_FLIGHT: Maximum number of scraping tasks running in the process (default 40).
+    JOBS_SITE_IN_FLIGHT: Maximum number of scraping tasks running for one site (default 10).
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+import os
+import asyncio
+import logging
+
+from module.deadline import Deadline, DeadlineExceeded
+
+
+MAX_IN_FLIGHT = int(os.environ.get('JOBS_MAX_IN_FLIGHT', 40))
+SITE_IN_FLIGHT = int(os.environ.get('JOBS_SITE_IN_FLIGHT', 10))
+
+# sites that need a lower limit than SITE_IN_FLIGHT
+SITE_LIMITS = {
+    'linkedin': 6,
+}
+
+
+class Scheduler:
+    """
+    Runs coroutine functions under a global limit and a per-site limit.
+
+    Attributes:
+        limit (int): Maximum number of tasks running in the process.
+        site_limits (dict): Maximum number of tasks running by site name.
+        default_site_limit (int): Limit of the sites missing from site_limits.
+        running (int): Number of tasks currently running.
+    """
+
+    def __init__(self, limit: int = MAX_IN_FLIGHT, site_limits: dict = None, default_site_limit: int = SITE_IN_FLIGHT):
+        self.limit = limit
+        self.site_limits = site_limits if site_limits is not None else SITE_LIMITS
+        self.default_site_limit = default_site_limit
+        self.running = 0
+        self._loop = None
+        self._slots = None
+        self._site_slots = {}
+
+    def _bind(self):
+        # asyncio semaphores belong to one event loop, create them again if the loop changes
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.limit)
+            self._site_slots = {}
+
+    def _site_slot(self, site: str) -> asyncio.Semaphore:
+        slot = self._site_slots.get(site)
+        if slot is None:
+            limit = min(self.site_limits.get(site, self.default_site_limit), self.limit)
+            slot = self._site_slots[site] = asyncio.Semaphore(limit)
+        return slot
+
+    async def run(self, site: str, func, *args, **kwargs):
+        """
+        Wait for a slot of the site and a global slot, then await func(*args, **kwargs).
+
+        Parameters:
+        site (str): Name of the site the task belongs to.
+        func (callable): A coroutine function.
+        *args, **kwargs: Passed to func.
+
+        Returns:
+        The result of func.
+        """
+        self._bind()
+        async with self._site_slot(site):
+            async with self._slots:
+                self.running += 1
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.running -= 1
+
+    async def pipeline(self, site: str, urls: list, get_cards, get_job_info, deadline: Deadline, ranking=None):
+        """
+        Fetch the card pages of a site and the job information of each card as a producer/consumer pipeline.
+
+        Every URL is passed to get_cards, and each card it returns is passed to get_job_info right away,
+        while the other pages are still loading. Both run under the limits of the site and within deadline:
+        no new task is started once it has passed and running tasks are cancelled.
+
+        Parameters:
+        site (str): Name of the site.
+        urls (list): The search URLs of the site.
+        get_cards (callable): Coroutine function returning the list of cards of a URL.
+        get_job_info (callable): Coroutine function returning the job dictionary of a card, or None.
+        deadline (Deadline): The deadline of the site.
+        ranking (Optional[TopK]): The best jobs of the search, every job is pushed to it before it is yielded.
+
+        Yields:
+            dict: Each job dictionary as soon as it is ready.
+        """
+        done = asyncio.Queue()
+        tasks = {}
+
+        def submit(func, arg, is_page):
+            # waiting for a slot counts against the deadline too
+            task = asyncio.ensure_future(deadline.run(self.run, site, func, arg))
+            tasks[task] = is_page
+            task.add_done_callback(done.put_nowait)
+
+        for url in urls:
+            submit(get_cards, url, True)
+
+        try:
+            while tasks:
+                task = await done.get()
+                is_page = tasks.pop(task)
+                if task.cancelled():
+                    continue
+                if isinstance(task.exception(), DeadlineExceeded):
+                    continue
+                if task.exception() is not None:
+                    logging.error('Error while scraping %s: %s', site, str(task.exception()))
+                    continue
+
+                if is_page:
+                    for card in task.result() or []:
+                        if deadline.expired():
+                            break
+                        submit(get_job_info, card, False)
+                elif task.result():
+                    if ranking is not None:
+                        ranking.push(task.result())
+                    yield task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+scheduler = Scheduler()
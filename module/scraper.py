@@ -0,0 +1,140 @@
+"""
+This module holds the steps shared by the scrapers of every site between a job card and the job they return.
+
+Each scraper only reads the fields of its cards and fetches the descriptions. The checks of the search, and the
+rating and saving of the jobs, are the same for every site:
+1. admits_card(): drop a card that breaks the rules of the search (module.prefilter), that cannot enter the best
+   top_k jobs (module.ranking) or whose fields match a posting already found (module.dedupe), before its description
+   is fetched.
+2. stored_description(): read the description of a job from the job store while it is fresh, instead of downloading
+   it again when a search is crawled.
+3. make_job(): drop a description that is a near duplicate of another one, rate it with the keywords of the search,
+   and save the job into the job store (module.store).
+
+The main class is:
+1. Scraper: Base class of the scrapers, with the search objects set by main.create_constructors.
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+from module.docsim import rate_text, normalize_text
+from module.store import save_job, job_store
+
+import json
+import asyncio
+
+
+class Scraper:
+    """
+    Base class of the site scrapers. The subclasses set site and palavras.
+
+    Attributes:
+        site (str): Site name used by the scheduler limits and the job store.
+        ranking (Optional[TopK]): Best jobs of the search, set by create_constructors when only the top_k jobs are returned.
+        dedupe (Optional[Deduper]): Postings already found by the search, set by create_constructors to drop the duplicates.
+        prefilter (Optional[CardFilter]): Rules of the search checked on the card, set by create_constructors.
+    """
+
+    site = None
+    ranking = None
+    dedupe = None
+    prefilter = None
+
+    def admits_card(self, title=None, company=None, location=None, job_id=None, day_posted=None, claim=True, rank_date=None) -> bool:
+        """
+        Return False if the description of a card is not needed.
+
+        Parameters:
+        title (Optional[str]): The job title, when the card shows it.
+        company (Optional[str]): The company name.
+        location (Optional[str]): The location of the job.
+        job_id (Optional[str]): The jobURL of the job.
+        day_posted (Optional[str]): The posting date, in a format known to docsim.date_category and ranking.recency_key.
+        claim (bool): Claim the card in dedupe, so that the same posting found later on any site is skipped.
+        rank_date (Optional[str]): The posting date checked by the ranking only, for the sites whose cards were
+            already filtered on their time period. Defaults to day_posted.
+
+        Returns:
+        bool: True if the description of the card has to be fetched.
+        """
+        # the card cannot qualify for the search
+        if self.prefilter is not None and not self.prefilter.admits(title=title, company=company, day_posted=day_posted, job_id=job_id):
+            return False
+
+        # the card cannot enter the best jobs of the search
+        rank_date = rank_date or day_posted
+        if self.ranking is not None and rank_date and not self.ranking.admits(rank_date):
+            return False
+
+        # the card has the fields of a posting already found by the search, on this site or on another one
+        if claim and self.dedupe is not None and not self.dedupe.claim(title, company, location):
+            return False
+
+        return True
+
+    async def stored_job(self, job_url):
+        """
+        Return a job of this site scraped less than JOBS_STORE_TTL seconds ago, see JobStore.find.
+
+        Parameters:
+        job_url (Optional[str]): The jobURL of the job.
+
+        Returns:
+        Optional[Tuple[dict, str]]: The stored job dictionary and its description, or None.
+        """
+        if job_store is None or not job_url:
+            return None
+        return await asyncio.to_thread(job_store.find, self.site, job_url)
+
+    async def stored_description(self, job_url):
+        """
+        Return the description of a job of this site scraped less than JOBS_STORE_TTL seconds ago, or None when it has
+        to be downloaded.
+        """
+        stored = await self.stored_job(job_url)
+        return stored[1] if stored else None
+
+    def make_job(self, description, title, company, day_posted, job_url, location, stored=False, **fields):
+        """
+        Rate the description of a card and return its job, saved into the job store for the next searches.
+
+        Parameters:
+        description (Optional[str]): The job description, None when it could not be fetched.
+        title, company, day_posted, job_url, location: The jobTitle, companyName, dayPosted, jobURL and location of the job.
+        stored (bool): The description was read from the job store, the job is not saved again so that it is
+            scraped again once its store TTL has passed.
+        **fields: Other fields of the job, such as datePosted.
+
+        Returns:
+        Optional[dict]: The job dictionary, or None without description or when it is the same posting as another job.
+        """
+        if not description:
+            # the posting was not found, a copy of it on another site is kept
+            if self.dedupe is not None:
+                self.dedupe.release(title, company, location)
+            return None
+
+        # the same posting published under another title
+        if self.dedupe is not None and self.dedupe.is_duplicate(description, title, company, location):
+            return None
+
+        try:
+            rating = rate_text(normalize_text(description), self.palavras)
+        except:
+            rating = '---'
+
+        job = {
+            "jobTitle": title,
+            "companyName": company,
+            "dayPosted": day_posted,
+            "jobURL": job_url,
+            'rating': rating,
+            'location': location,
+            **fields
+        }
+
+        if not stored:
+            save_job(self.site, job, description)
+        print('JOB: ', json.dumps(job, indent=2))
+        return job
@@ -0,0 +1,314 @@
+"""
+This module keeps every job scraped by the searches in a SQLite job store, so that later searches can be answered
+from it instead of crawling the sites again.
+
+Every scraper saves the jobs it returns, with their description, into the jobs table. The scrapers run on the event
+loop, so the jobs are only buffered there and written at once by link() or search(), which run in a worker thread.
+A job is identified by its site
+and its jobURL; saving it again refreshes its fields and the time it was scraped. The table is indexed on the site,
+the job id, the posting date and the title, so a search only reads the rows it needs. The sites also return jobs whose
+title or city differ from the search, so the jobs found by a search are linked to its titles and city in the
+search_jobs table.
+
+A search first looks for the jobs of its titles, location and time period scraped less than JOBS_STORE_TTL seconds
+ago: the jobs linked to the same titles and city, and the stored jobs whose title and city match. When there are
+enough of them the search is answered from the store in milliseconds, rating the stored descriptions with the keywords
+of the search. Otherwise the sites are crawled, which refreshes the stale jobs and adds
+the missing ones. The crawl reads the description of a job still fresh in the store with find() instead of downloading
+it again, and leaves its row as it is, so the job is scraped again once JOBS_STORE_TTL has passed.
+
+The main class and functions are:
+1. JobStore(path): The SQLite job store, with save(), flush(), link(), search() and find().
+2. save_job(site, job, description): Save a job into job_store, used by the scrapers.
+3. open_store(path): Open the job store, or return None if it cannot be opened.
+
+Settings (environment variables):
+    JOBS_STORE_PATH: Path of the SQLite file of the job store, shared by the workers. The store is kept in memory when
+        it is not set, and disabled when it is set to an empty string.
+    JOBS_STORE_TTL: Number of seconds a stored job is used to answer searches before it is scraped again (default 6 hours).
+    JOBS_STORE_RETENTION: Number of seconds a job is kept since it was last scraped (default 30 days).
+
+Developer: Irfan Ahmad, devirfan.mlka@gmail.com
+Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
+"""
+
+from datetime import date, timedelta
+
+from module.docsim import parse_date
+from module.dedupe import fold
+
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+
+
+STORE_PATH = os.environ.get('JOBS_STORE_PATH', ':memory:')
+STORE_TTL = int(os.environ.get('JOBS_STORE_TTL', 6 * 3600))
+STORE_RETENTION = int(os.environ.get('JOBS_STORE_RETENTION', 30 * 24 * 3600))
+
+LOCATION_SEPARATOR = re.compile(r'\s*[,\-/]\s*')
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS jobs (
+        site TEXT NOT NULL,
+        job_id TEXT NOT NULL,
+        title TEXT,
+        company TEXT,
+        location TEXT,
+        day_posted TEXT,
+        description TEXT,
+        title_key TEXT,
+        location_key TEXT,
+        posted TEXT,
+        first_seen REAL,
+        scraped REAL,
+        PRIMARY KEY (site, job_id)
+    )''',
+    'CREATE INDEX IF NOT EXISTS jobs_job_id ON jobs (job_id)',
+    'CREATE INDEX IF NOT EXISTS jobs_posted ON jobs (posted)',
+    'CREATE INDEX IF NOT EXISTS jobs_title ON jobs (title_key)',
+    'CREATE INDEX IF NOT EXISTS jobs_scraped ON jobs (scraped)',
+    '''CREATE TABLE IF NOT EXISTS search_jobs (
+        search TEXT NOT NULL,
+        job_id TEXT NOT NULL,
+        linked REAL,
+        PRIMARY KEY (search, job_id)
+    )''',
+)
+
+
+def key(text) -> str:
+    # the words of a field without accents, as stored in title_key and location_key
+    return ' '.join(fold(text)) if isinstance(text, str) else ''
+
+
+def city(location: str) -> str:
+    """
+    Return the key of the first part of a location, the city, such as "porto alegre" for "Porto Alegre, RS, Brazil".
+    """
+    return key(LOCATION_SEPARATOR.split((location or '').strip())[0])
+
+
+def phrase_pattern(text: str) -> str:
+    """
+    Return the LIKE pattern matching a key that contains text as whole words, once the key is padded with spaces.
+    """
+    text = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'% {text} %'
+
+
+def search_key(titles: list, location: str) -> str:
+    """
+    Return the key of a search in search_jobs, from its titles in any order and its city.
+    """
+    return '|'.join(sorted({key(title) for title in titles})) + '@' + city(location)
+
+
+class JobStore:
+    """
+    The jobs scraped by the searches, stored in a SQLite file shared by every process that opens it.
+
+    Attributes:
+        path (str): Path of the SQLite database file, ":memory:" for a store private to the process.
+        ttl (float): Number of seconds a stored job is used to answer searches.
+    """
+
+    def __init__(self, path: str, ttl: float = STORE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # rows saved from the event loop, written by flush()
+        self.pending = []
+        self.pending_lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        # a crash may lose the last jobs saved, never corrupt the file
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        self.connection.execute('DELETE FROM jobs WHERE scraped < ?', (time.time() - STORE_RETENTION,))
+        self.connection.execute('DELETE FROM search_jobs WHERE linked < ?', (time.time() - STORE_RETENTION,))
+
+    def save(self, site: str, job: dict, description: str):
+        """
+        Save a job scraped from site with its description, refreshing it if it is already stored.
+
+        The job is buffered without touching the database, so it can be called from the event loop. It is written by
+        the next flush().
+        """
+        now = time.time()
+        day_posted = job.get('dayPosted') if isinstance(job.get('dayPosted'), str) else None
+        # the ISO date given by some sites besides a relative dayPosted text
+        date_posted = job.get('datePosted') if isinstance(job.get('datePosted'), str) else day_posted
+        posted = parse_date(date_posted.strip().lower(), date.today()) if date_posted else None
+
+        row = (
+            site, job['jobURL'], job.get('jobTitle'), job.get('companyName'), job.get('location'), day_posted,
+            description, key(job.get('jobTitle')), key(job.get('location')),
+            posted.isoformat() if posted else None, now, now,
+        )
+        with self.pending_lock:
+            self.pending.append(row)
+
+    def flush(self):
+        """
+        Write the jobs buffered by save() in a single transaction.
+        """
+        with self.pending_lock:
+            rows, self.pending = self.pending, []
+        if not rows:
+            return
+
+        try:
+            with self.lock:
+                # one transaction for all the rows, not one per row
+                self.connection.execute('BEGIN')
+                try:
+                    self.connection.executemany(
+                        '''INSERT INTO jobs (site, job_id, title, company, location, day_posted, description,
+                                             title_key, location_key, posted, first_seen, scraped)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                           ON CONFLICT (site, job_id) DO UPDATE SET
+                             title = excluded.title, company = excluded.company, location = excluded.location,
+                             day_posted = excluded.day_posted, description = excluded.description,
+                             title_key = excluded.title_key, location_key = excluded.location_key,
+                             posted = excluded.posted, scraped = excluded.scraped''',
+                        rows
+                    )
+                    self.connection.execute('COMMIT')
+                except sqlite3.Error:
+                    self.connection.execute('ROLLBACK')
+                    raise
+        except sqlite3.Error as e:
+            logging.error('Error while saving %d jobs into the job store: %s', len(rows), str(e))
+
+    def link(self, titles: list, location: str, job_ids: list):
+        """
+        Write the jobs buffered by save() and link the jobs found by a crawl to the titles and location of its search.
+        """
+        self.flush()
+        now = time.time()
+        search = search_key(titles, location)
+        try:
+            with self.lock:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO search_jobs (search, job_id, linked) VALUES (?, ?, ?)',
+                    [(search, job_id, now) for job_id in job_ids]
+                )
+        except sqlite3.Error as e:
+            logging.error('Error while linking jobs in the job store: %s', str(e))
+
+    def search(self, titles: list, location: str = None, max_age: int = None, limit: int = 100) -> list:
+        """
+        Return the stored jobs of a search scraped less than ttl seconds ago, the most recently posted first.
+
+        Parameters:
+        titles (List[str]): The job titles, a job matches if it was found by a search of the same titles and location,
+            or if its title contains the words of one of them and it is in the city of the search.
+        location (Optional[str]): The location of the search, only its city is matched.
+        max_age (Optional[int]): Maximum age of the jobs in seconds. A job without a known posting date is
+            dated from the first time it was scraped.
+        limit (int): Maximum number of jobs returned.
+
+        Returns:
+        List[Tuple[dict, str]]: The job dictionaries, without rating, and their descriptions. datePosted is the
+            posting date known to the store as an ISO date, or None.
+        """
+        self.flush()
+        search = search_key(titles, location)
+        titles = [key(title) for title in titles if key(title)]
+        if not titles:
+            return []
+
+        query = 'SELECT site, job_id, title, company, location, day_posted, posted, description FROM jobs WHERE scraped > ?'
+        params = [time.time() - self.ttl]
+
+        # whole words only, "ti" does not match "estatistico"
+        matches = '(' + ' OR '.join("' ' || title_key || ' ' LIKE ? ESCAPE '\\'" for _ in titles) + ')'
+        params.append(search)
+        params.extend(phrase_pattern(title) for title in titles)
+        if location and city(location):
+            matches += " AND ' ' || location_key || ' ' LIKE ? ESCAPE '\\'"
+            params.append(phrase_pattern(city(location)))
+        query += f' AND (job_id IN (SELECT job_id FROM search_jobs WHERE search = ?) OR {matches})'
+
+        if max_age is not None:
+            cutoff = date.today() - timedelta(seconds=max_age)
+            query += " AND COALESCE(posted, date(first_seen, 'unixepoch')) >= ?"
+            params.append(cutoff.isoformat())
+
+        query += ' ORDER BY posted DESC, scraped DESC LIMIT ?'
+        params.append(limit)
+
+        try:
+            with self.lock:
+                rows = self.connection.execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            logging.error('Error while searching the job store: %s', str(e))
+            return []
+
+        return [
+            ({'jobTitle': title, 'companyName': company, 'dayPosted': day_posted, 'datePosted': posted, 'jobURL': job_id,
+              'location': location},
+             description)
+            for site, job_id, title, company, location, day_posted, posted, description in rows
+        ]
+
+    def find(self, site: str, job_id: str):
+        """
+        Return a job of site scraped less than ttl seconds ago, so that a crawl does not download its description again.
+
+        Parameters:
+        site (str): The site of the job.
+        job_id (str): The jobURL of the job.
+
+        Returns:
+        Optional[Tuple[dict, str]]: The job dictionary, without rating, and its description, or None if the job is not
+            stored or is stale.
+        """
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    '''SELECT title, company, location, day_posted, posted, description FROM jobs
+                       WHERE site = ? AND job_id = ? AND scraped > ?''',
+                    (site, job_id, time.time() - self.ttl)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logging.error('Error while reading a job from the job store: %s', str(e))
+            return None
+
+        if row is None or not row[5]:
+            return None
+        title, company, location, day_posted, posted, description = row
+        return ({'jobTitle': title, 'companyName': company, 'dayPosted': day_posted, 'datePosted': posted, 'jobURL': job_id,
+                 'location': location},
+                description)
+
+
+def open_store(path: str = STORE_PATH):
+    """
+    Open the job store at path, or return None if it is disabled or cannot be opened.
+    """
+    if not path:
+        return None
+    try:
+        return JobStore(path)
+    except sqlite3.Error as e:
+        logging.error('Error while opening the job store %s: %s', path, str(e))
+        return None
+
+
+job_store = open_store()
+
+
+def save_job(site: str, job: dict, description: str):
+    """
+    Save a job returned by a scraper into job_store, if the store is enabled. It is written once the crawl is linked
+    to its search, see JobStore.save.
+    """
+    if job_store is not None and description:
+        job_store.save(site, job, description)
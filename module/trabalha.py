@@ -7,19 +7,23 @@ Project Owner: Monica Piccinini, monicapiccinini12@gmail.com
 """
 
 
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import Optional, List, Union
 
 from woocommerce import API
-from module.docsim import rate_text, normalize_text, date_category
+from module.docsim import normalize_text, date_category
+from module import client
+from module.scheduler import scheduler
+from module.parser import make_soup, select_text
+from module.cache import description_cache, description_key, single_flight
+from module.scraper import Scraper
 from itertools import repeat
 from math import sqrt
 
-from concurrent.futures import ThreadPoolExecutor
-from threading import Event, Thread
+from module.deadline import Deadline
 
 import os
-import requests
+import asyncio
 import json
 import re
 import time
@@ -28,10 +32,9 @@ import logging
 import unicodedata
 
 
-requests.adapters.DEFAULT_RETRIES = 3
 headers = {'user-agent':'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/537.36'}
 
-class Trabalha:
+class Trabalha(Scraper):
     """
     A class used to represent a Trabalha Brasil job scraper.
 
@@ -41,8 +44,8 @@ class Trabalha:
         A list of Trabalha Brasil job search URLs.
     palavras : list
         A list of keywords to rate the jobs.
-    timeout_event : Event
-        A threading Event object to control the timeout functionality.
+    deadline : Deadline
+        The deadline of the scraper, no page is fetched after it has passed.
     card_num : int, optional
         The maximum number of job cards to be returned, defaults to 10.
 
@@ -54,17 +57,22 @@ class Trabalha:
         Extracts job information from a BeautifulSoup card object and a list of keywords.
     extractDescription(self, url)
         Extracts job description from a Trabalha Brasil job posting URL.
+    stream(self)
+        Yields each job posting as soon as its description is rated.
     main(self)
         Controls the flow of the script, fetching job cards, extracting information, and returning the result.
     """
     
-    def __init__(self, urls:list, palavras, timeout_event: Event, card_num=10):
+    # site name used by the scheduler limits
+    site = 'trabalha'
+
+    def __init__(self, urls:list, palavras, deadline: Deadline, card_num=10):
         self.urls = urls
         self.palavras = palavras
-        self.timeout_event = timeout_event
+        self.deadline = deadline
         self.card_num = card_num
         
-    def get_job_cards(self, url):
+    async def get_job_cards(self, url):
         """
         Fetches the HTML content from a Trabalha Brasil jobs search URL and returns a list of job cards as BeautifulSoup objects.
         
@@ -75,17 +83,16 @@ class Trabalha:
             List[bs4.element.Tag]: A list of job cards as BeautifulSoup objects.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return []
             
         print('===========>Getting cards for: ', url)
-        res = requests.get(url, timeout=3)
+        res = await client.get(url, timeout=3)
         cards = []
         if res.status_code==200:
-            time.sleep(.5)
             html = res.content
       
-            soup = BeautifulSoup(html, "html.parser")
+            soup = make_soup(html, SoupStrainer('div', id='jobs-wrapper'))
 
             cards_list = soup.find('div', {"id":"jobs-wrapper"})
       
@@ -100,7 +107,7 @@ class Trabalha:
         return cards
     
     
-    def get_job_info(self, card):
+    async def get_job_info(self, card):
         """
         Extracts job information from a BeautifulSoup card object and a list of keywords (palavras).
           
@@ -112,7 +119,7 @@ class Trabalha:
             dict: A dictionary containing job title, company name, day posted, job URL, rating, and location.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return {}
         jobTitle = card.find('h2', class_='job__name').text.strip()
         
@@ -124,35 +131,24 @@ class Trabalha:
         except:
             location = 'location not given'
 
-        jobDesc = self.extractDescription(jobURL)
-  
         try:
             companyName = card.find('h3', class_='job__company').text.strip()
         except:
             companyName = 'Not specified'
-        
-        rating = 0
-        
-        if jobDesc is not None:
-            try:
-                rating = rate_text(normalize_text(jobDesc), self.palavras)
-            except:
-                rating = '---'
-        
-            job = {
-          "jobTitle": jobTitle,
-          "companyName": companyName,
-          "dayPosted": dayPosted,
-           "jobURL": jobURL,
-           'rating': rating,
-          'location': normalize_text(location)
-                }
-      
-            print('JOB: ', json.dumps(job, indent=2))
-            return job
 
+        if not self.admits_card(jobTitle, companyName, location, jobURL):
+            return
+
+        # the description of a job found by a recent search is not downloaded again
+        stored = await self.stored_description(jobURL)
+        jobDesc = stored or await self.extractDescription(jobURL)
 
-    def """
+        return self.make_job(jobDesc, jobTitle, companyName, dayPosted, jobURL, normalize_text(location), stored=bool(stored))
+
+
+    @single_flight(lambda self, url: description_key('trabalha', url))
+    async def extractDescription(self, url):
+        """
         Extracts job description from a Trabalha Brasil job posting URL.
           
         Args:
@@ -162,29 +158,45 @@ class Trabalha:
             str: The job description as a string, or None if not found.
         """
         
-        if self.timeout_event.is_set():
+        if self.deadline.expired():
             return None
+        
+        cache_key = description_key('trabalha', url)
+        description = await description_cache.aget(cache_key)
+        if description is not None:
+            return description
+        
         try:
-            res = requests.get(url, headers=headers, timeout=3)
+            res = await client.get(url, headers=headers, timeout=3)
             if res.status_code == 200:
-                html = res.content
+                html = res.text
 
-                soup = BeautifulSoup(html, "html.parser")
-                descriptionDiv = soup.find("div", class_="jobview__info")
-      
                 # Get the text content of the element
-                if descriptionDiv is not None:
-                    description = descriptionDiv.text.strip()
-                else:
+                description = select_text(html, "div.jobview__info")
+                if description is None:
                     description = 'no description specified'
                 
+                if description is not None:
+                    await description_cache.aset(cache_key, description)
                 return description
 
         except Exception as e:
             print('Error while getting job description: %s, %s', str(e), url)
             return None
         
-    def main(self):
+    async def stream(self):
+        """
+        Fetches the job cards and yields each job posting as soon as its description is rated.
+        Cards are queued for their description as soon as their own page is parsed.
+
+        Yields:
+            dict: A dictionary with the job details.
+        """
+        
+        async for job in scheduler.pipeline(self.site, self.urls, self.get_job_cards, self.get_job_info, self.deadline, self.ranking):
+            yield job
+
+    async def main(self):
         """
         Controls the flow of the script, fetching job cards, extracting information, and returning the result.
 
@@ -193,31 +205,7 @@ class Trabalha:
         """
         
         try:
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                cards = executor.map(self.get_job_cards, self.urls)
-
-            cards = list(cards)
-            print('//////////////////////')
-            print('Totla trabalha Cards: ', len([crd for card in cards for crd in card]))
-            print('//////////////////////')
-
-            if len(cards) ==0:
-                return [[], 0]
-
-            results = []
-            
-            jobs_data_list = []
-            
-            for card in cards:
-                if self.timeout_event.is_set():
-                    break
-                if len(card)>0:
-                    with ThreadPoolExecutor(max_workers=len(card)) as executor:
-                        job_data = executor.map(self.get_job_info, card)
-
-                    jobs_data_list.extend(list(job_data))
-
-            results = [jb for jb in jobs_data_list if jb]
+            results = [job async for job in self.stream()]
     
             total_cards = len(results)
       
@@ -248,17 +236,13 @@ if __name__ == '__main__':
 	'espanhol'
 	]
 	
-    timeout_event = Event()
-    # Start the timeout thread before calling the extractJobs function
-    def stop_extraction():
-        time.sleep(60)
-        timeout_event.set()
+    async def run_extraction():
+        # Stop the scraper once the time limit is reached
+        deadline = Deadline(60)
+        trabalha = Trabalha([WEBSITE_URL], plavra, deadline)
+        return await trabalha.main()
 
-    extraction_thread = Thread(target=stop_extraction)
-    extraction_thread.start()
-    
-    trabalha = Trabalha([WEBSITE_URL], plavra, timeout_event)
-    jobs = trabalha.main()
+    jobs = asyncio.run(run_extraction())
 
     print('=+=+=+=+=+=+=+=+==+=+=+=++==+==++=+==+=+=+=+=+=+=+=+=+=+==+=+=+')
     print(json.dumps(jobs, indent=2))